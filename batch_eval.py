@@ -0,0 +1,188 @@
+# batch_eval.py
+"""NumPy evaluation of many states at once: the same terms as BoardState.calculate_heuristic(False),
+computed on packed arrays instead of one state at a time.
+
+States are packed as
+    tableau     N x 8 x 19 card ids (-1 = no card; 19 = 7 dealt cards + a Q..A run, the tallest possible pile)
+    heights     N x 8
+    foundations N x 4 cards home per suit, in TYPES order
+    free_cells  N x 4 card ids (-1 = empty)
+    move_count  N
+and card ids are Card.id (suit index * 13 + value - 1), so BoardState and CompactBoardState pack the same way.
+"""
+import numpy as np
+
+from constants import *
+from freecell_bot import PHASE_WEIGHTS
+
+MAX_PILE_HEIGHT = 19
+NO_CARD = -1
+
+CARD_VALUE = np.array([card_id % 13 + 1 for card_id in range(52)] + [0], dtype=np.int16)  # index -1 -> 0
+CARD_SUIT = np.array([card_id // 13 for card_id in range(52)] + [-1], dtype=np.int16)
+CARD_RED = np.array([card_id >= 26 for card_id in range(52)] + [False])
+
+PADDING = [[NO_CARD] * (MAX_PILE_HEIGHT - height) for height in range(MAX_PILE_HEIGHT + 1)]
+
+PHASES = ("early", "mid", "late")
+WEIGHT_NAMES = ("FOUNDATION_MULTIPLIER", "FREECELL_MULTIPLIER", "TABLEAU_EMPTY_SCORE", "ORDER_MULTIPLIER",
+                "CARD_EXCAVATION_MULTIPLIER", "CHAIN_MULTIPLIER", "BLOCKED_CARD_PENALTY", "SAME_COLOR_BLOCK_PENALTY",
+                "BALANCE_MULTIPLIER", "POTENTIAL_MOVE_MULTIPLIER", "MOVE_COUNT_SCORE")
+
+
+def card_ids(cards):
+    """Card ids of a pile or the free cells of either state class; empty cells become NO_CARD"""
+    if isinstance(cards, bytes):
+        return [NO_CARD if card == 0xFF else card for card in cards]
+    return [NO_CARD if card is None else card.id for card in cards]
+
+
+def foundation_levels(state):
+    if isinstance(state.foundations, bytes):
+        return list(state.foundations)
+    return [len(state.foundations[suit]) for suit in TYPES]
+
+
+class PackedStates:
+    """States collected as flat Python rows and turned into arrays in one go, which is much cheaper than
+    writing every pile into NumPy separately"""
+
+    def __init__(self):
+        self.tableau = []
+        self.heights = []
+        self.foundations = []
+        self.free_cells = []
+        self.move_count = []
+
+    def __len__(self):
+        return len(self.heights)
+
+    def add(self, state):
+        row = []
+        heights = []
+        for pile in state.tableau:
+            ids = card_ids(pile)
+            row += ids
+            row += PADDING[len(ids)]
+            heights.append(len(ids))
+        self.tableau.append(row)
+        self.heights.append(heights)
+        self.foundations.append(foundation_levels(state))
+        self.free_cells.append(card_ids(state.free_cells))
+        self.move_count.append(state.move_count)
+
+    def arrays(self):
+        n = len(self.heights)
+        return (np.array(self.tableau, dtype=np.int16).reshape(n, TABLEAU_COUNT, MAX_PILE_HEIGHT),
+                np.array(self.heights, dtype=np.int16).reshape(n, TABLEAU_COUNT),
+                np.array(self.foundations, dtype=np.int16).reshape(n, len(TYPES)),
+                np.array(self.free_cells, dtype=np.int16).reshape(n, FREECELL_COUNT),
+                np.array(self.move_count, dtype=np.float64))
+
+
+class BatchEvaluator:
+    """Vectorised calculate_heuristic(False) over packed states"""
+
+    def __init__(self, phase_weights=PHASE_WEIGHTS):
+        # phases x weights; row picked per state from its foundation progress like BoardState.get_game_phase
+        self.weights = np.array([[getattr(phase_weights[phase], name) for name in WEIGHT_NAMES]
+                                 for phase in PHASES], dtype=np.float64)
+
+    def score_states(self, states):
+        packed = PackedStates()
+        for state in states:
+            packed.add(state)
+        return self.score_packed(packed)
+
+    def score_children(self, board):
+        """(moves, scores) for every legal move of board, played and taken back in place like the look-ahead"""
+        moves = board.legal_moves()
+        packed = PackedStates()
+        for move in moves:
+            played = board.apply_with_auto_play(move)
+            packed.add(board)
+            board.undo_all(played)
+        return moves, self.score_packed(packed)
+
+    def score_packed(self, packed):
+        tableau, heights, foundations, free_cells, move_count = packed.arrays()
+        n = len(heights)
+        if n == 0:
+            return np.zeros(0)
+
+        home = foundations.sum(axis=1)
+        progress = home / 52
+        phase = np.where(progress < 0.2, 0, np.where(progress < 0.7, 1, 2))
+        (foundation_w, freecell_w, empty_w, order_w, excavation_w, chain_w, blocked_w, same_color_w, balance_w,
+         potential_w, move_w) = self.weights[phase].T
+
+        values = CARD_VALUE[tableau]
+        suits = CARD_SUIT[tableau]
+        red = CARD_RED[tableau]
+        positions = np.arange(MAX_PILE_HEIGHT)
+        occupied = positions < heights[:, :, None]
+
+        score = home * foundation_w
+        score = score + (free_cells == NO_CARD).sum(axis=1) * freecell_w
+
+        # Empty columns, and a bonus shrinking with the height of the others
+        safe_heights = np.maximum(heights, 1)
+        score = score + np.where(heights == 0, empty_w[:, None] * 2, empty_w[:, None] / safe_heights).sum(axis=1)
+
+        # links[k] is True when card k + 1 sits correctly on card k
+        links = ((values[:, :, 1:] == values[:, :, :-1] - 1) & (red[:, :, 1:] != red[:, :, :-1])
+                 & occupied[:, :, 1:])
+        in_link_range = occupied[:, :, 1:]
+        in_sequence = ~(in_link_range & ~links).any(axis=2)
+        score = score + (np.where(in_sequence & (heights > 0), heights, 0) * order_w[:, None]).sum(axis=1)
+
+        # Longest run of consecutive links, + 1 for the cards in it
+        run = np.zeros((n, TABLEAU_COUNT), dtype=np.int16)
+        longest = np.zeros((n, TABLEAU_COUNT), dtype=np.int16)
+        for k in range(MAX_PILE_HEIGHT - 1):
+            run = np.where(links[:, :, k], run + 1, 0)
+            longest = np.maximum(longest, run)
+        longest = longest + 1
+
+        top_index = np.maximum(heights - 1, 0)
+        tops = np.take_along_axis(tableau, top_index[:, :, None], axis=2)[:, :, 0]
+        tops = np.where(heights > 0, tops, NO_CARD)
+        top_values = CARD_VALUE[tops]
+        top_suits = CARD_SUIT[tops]
+        top_home = np.take_along_axis(foundations, np.maximum(top_suits, 0), axis=1)
+        top_to_foundation = (tops != NO_CARD) & (top_values == top_home + 1)
+
+        chains = longest.astype(np.float64) ** 1.5 * chain_w[:, None]
+        chains = np.where((longest > 1) & top_to_foundation, chains * 1.3, chains)
+        score = score + np.where(heights > 1, chains, 0).sum(axis=1)
+
+        # The next card of every foundation: excavation bonus and blocking penalty when it is in the tableau
+        for s in range(len(TYPES)):
+            level = foundations[:, s]
+            needed = np.where(level < 13, s * 13 + level, -2)
+            where = (tableau == needed[:, None, None]) & occupied
+            found = where.any(axis=(1, 2))
+            pile = where.any(axis=2).argmax(axis=1)
+            depth = where.any(axis=1).argmax(axis=1)
+            pile_height = heights[np.arange(n), pile]
+
+            cards_above = np.where(found, pile_height - depth - 1, 0)
+            score = score + np.where(found, s * 2 + excavation_w / np.maximum(pile_height - depth, 1), 0)
+
+            above = (positions[None, :] > depth[:, None]) & occupied[np.arange(n), pile]
+            same_color = above & (red[np.arange(n), pile] == (s >= 2))
+            score = score - np.where(found, cards_above * blocked_w + same_color.sum(axis=1) * same_color_w, 0)
+
+        std_dev = foundations.std(axis=1)
+        score = score + np.maximum(0, (5 - std_dev) * balance_w)
+
+        # Ordered pairs of tops where the first can go on the second, plus a move to each empty column
+        stackable = ((top_values[:, :, None] == top_values[:, None, :] - 1)
+                     & (CARD_RED[tops][:, :, None] != CARD_RED[tops][:, None, :])
+                     & (tops[:, :, None] != NO_CARD) & (tops[:, None, :] != NO_CARD))
+        empty_piles = (heights == 0).sum(axis=1)
+        potential = stackable.sum(axis=(1, 2)) + np.where(empty_piles > 0, TABLEAU_COUNT - empty_piles, 0)
+        score = score + potential * potential_w
+
+        score = score - move_count * move_w
+        return np.where(home == 52, VICTORY_SCORE, score)
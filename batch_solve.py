@@ -0,0 +1,207 @@
+# batch_solve.py
+"""Headless solver: runs FreecellBot over many deals on a process pool and streams one JSON line per deal.
+
+    python batch_solve.py --seeds 0-999 --workers 8 > results.jsonl
+    python batch_solve.py --seeds 1-32000 --ms > results.jsonl
+    python batch_solve.py --deal-file deals.txt --max-nodes 5000 --output results.jsonl
+    python batch_solve.py --seeds 1-100 --ms --engine wastar --weight 2
+    python batch_solve.py --seeds 1-10 --ms --stats      # add search counters and timers to every record
+    python batch_solve.py --seeds 617 --ms --profile-dir profiles  # cProfile dump and timers, see profiling.py
+    python batch_solve.py --seeds 1-32000 --ms --store solutions.db   # reuse and extend stored solutions
+"""
+import argparse
+import contextlib
+import cProfile
+import io
+import json
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import psutil
+
+from freecell_bot import FreecellBot
+from freecell_game import FreeCell
+from profiling import ComponentTimers, write_profile
+from search_engines import make_engine
+from solution_store import SolutionStore
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+DEFAULT_MAX_NODES = 20000
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")  # colorama codes in the card names
+
+
+def peak_rss_mb():
+    """High-water RSS of this process in MB"""
+    if resource is None:
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":  # bytes on macOS, kilobytes elsewhere
+        return peak / 1024 ** 2
+    return peak / 1024
+
+
+def solve_deal(seed, max_nodes=DEFAULT_MAX_NODES, time_limit=None, compact=False, ms=False, max_frontier=None,
+               frontier_mb=None, engine="greedy", weight=1.0, heuristic="informed", stats=False,
+               component_timers=False, profile_dir=None, store_path=None):
+    """Solve one deal and return its result record; runs inside a worker process.
+    seed is a Microsoft deal number when ms is set, a random.seed value otherwise.
+    profile_dir turns on cProfile and the component timers and writes both there; store_path is a SolutionStore
+    file consulted first and extended with what this solve finds"""
+    if ms:
+        game = FreeCell(compact=compact, deal=seed)
+    else:
+        random.seed(seed)
+        game = FreeCell(compact=compact)
+    store = SolutionStore(store_path) if store_path else None
+    bot = FreecellBot(max_frontier=max_frontier, frontier_mb=frontier_mb,
+                      engine=make_engine(engine, weight, heuristic), stats=stats, store=store)
+
+    timers = ComponentTimers() if component_timers or profile_dir else None
+    profiler = cProfile.Profile() if profile_dir else None
+
+    start = time.time()
+
+    # The bot reports on stdout, which would corrupt the JSONL stream
+    with contextlib.redirect_stdout(io.StringIO()), timers or contextlib.nullcontext(), \
+            profiler or contextlib.nullcontext():
+        result = bot.solve(game, time_limit, max_nodes)
+    if store is not None:
+        store.close()
+
+    moves = ANSI_ESCAPE.sub("", bot.solution_text()).splitlines() if result.solved else []
+
+    record = {
+        "seed": seed,
+        "ms": ms,
+        "engine": engine,
+        "solved": result.solved,
+        "stop_reason": result.reason,
+        "from_store": bot.stored_line is not None,
+        "foundation_cards": result.foundation_cards,
+        "moves": moves,
+        "move_count": len(moves),
+        "nodes": result.nodes,
+        "duplicates": bot.context.dedupe if bot.context else {},
+        "evicted": bot.queue.evicted,
+        "look_ahead_hit_rate": round(bot.context.look_ahead_table.hit_rate(), 4) if bot.context else 0.0,
+        "peak_frontier": bot.queue.peak_size,
+        "wall_time": round(time.time() - start, 4),
+        "peak_rss_mb": round(peak_rss_mb(), 2),
+        "pid": os.getpid(),
+    }
+    if stats:
+        record["stats"] = bot.search_stats()
+    if timers is not None:
+        record["components"] = timers.summary()
+    if profile_dir:
+        record["profile"] = write_profile(profile_dir, f"{'ms' if ms else 'seed'}-{seed}", profiler, record)
+    return record
+
+
+def parse_seeds(spec):
+    """'0-99,120,200-210' -> [0, ..., 99, 120, 200, ..., 210]"""
+    seeds = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            seeds.extend(range(int(first), int(last) + 1))
+        else:
+            seeds.append(int(part))
+    return seeds
+
+
+def read_deal_file(path):
+    """One deal seed per line; blank lines and '#' comments are ignored"""
+    seeds = []
+    with open(path) as deal_file:
+        for line in deal_file:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                seeds.append(int(line))
+    return seeds
+
+
+def run_batch(seeds, workers=None, max_nodes=DEFAULT_MAX_NODES, time_limit=None, compact=False,
+              fresh_workers=False, ms=False, max_frontier=None, frontier_mb=None, engine="greedy", weight=1.0,
+              heuristic="informed", stats=False, component_timers=False, profile_dir=None, store_path=None):
+    """Yield result records in completion order. A deal whose solve raised gets an error record instead
+    ({"seed", "solved": False, "error"}), so one bad deal does not end the batch"""
+    # One task per worker keeps peak_rss_mb a per-deal number, at the cost of a process start per deal
+    max_tasks = 1 if fresh_workers else None
+
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=max_tasks) as pool:
+        futures = {pool.submit(solve_deal, seed, max_nodes, time_limit, compact, ms, max_frontier, frontier_mb,
+                               engine, weight, heuristic, stats, component_timers, profile_dir, store_path): seed
+                   for seed in seeds}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as exc:  # includes BrokenProcessPool when a worker died
+                yield {"seed": futures[future], "solved": False, "error": repr(exc)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve FreeCell deals in parallel and write JSONL results")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--seeds", help="deal seeds, e.g. 0-999 or 1,5,10-20")
+    source.add_argument("--deal-file", help="file with one deal seed per line")
+    parser.add_argument("--ms", action="store_true", help="seeds are Microsoft FreeCell deal numbers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--max-nodes", type=int, default=DEFAULT_MAX_NODES,
+                        help="give up after expanding this many states")
+    parser.add_argument("--time-limit", type=float, default=None, help="give up after this many seconds per deal")
+    parser.add_argument("--max-frontier", type=int, default=None, help="keep at most this many queued states")
+    parser.add_argument("--frontier-mb", type=float, default=None, help="size the queue to about this many MB")
+    parser.add_argument("--engine", default="greedy", choices=["greedy", "wastar", "idastar"])
+    parser.add_argument("--weight", type=float, default=1.0, help="w in f = g + w * h for wastar/idastar")
+    parser.add_argument("--heuristic", default="informed", choices=["informed", "admissible"],
+                        help="h for wastar/idastar; admissible with weight 1 gives shortest solutions")
+    parser.add_argument("--compact", action="store_true", help="search on CompactBoardState")
+    parser.add_argument("--stats", action="store_true",
+                        help="record search counters and timers (greedy engine) in a \"stats\" field")
+    parser.add_argument("--component-timers", action="store_true",
+                        help="time every heuristic component and the move generator, in a \"components\" field")
+    parser.add_argument("--profile-dir", help="write a cProfile dump and a JSON summary per deal here")
+    parser.add_argument("--store", help="SQLite solution store to check first and add new solutions to")
+    parser.add_argument("--fresh-workers", action="store_true", help="new process per deal, for exact peak RSS")
+    parser.add_argument("--output", help="write JSONL here instead of stdout")
+    args = parser.parse_args(argv)
+
+    seeds = parse_seeds(args.seeds) if args.seeds else read_deal_file(args.deal_file)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    solved = errors = 0
+    start = time.time()
+    try:
+        for record in run_batch(seeds, args.workers, args.max_nodes, args.time_limit, args.compact,
+                                args.fresh_workers, args.ms, args.max_frontier, args.frontier_mb, args.engine,
+                                args.weight, args.heuristic, args.stats, args.component_timers,
+                                args.profile_dir, args.store):
+            solved += record["solved"]
+            errors += "error" in record
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print("Solved {}/{} deals in {:.2f} seconds ({} failed with an error)".format(solved, len(seeds),
+                                                                              time.time() - start, errors),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
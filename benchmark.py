@@ -0,0 +1,222 @@
+# benchmark.py
+"""Solver benchmark: solves a fixed corpus of Microsoft deals, times the hot BoardState methods, writes the
+results to JSON and compares them with a stored baseline.
+
+    python benchmark.py --update-baseline          # record benchmark_baseline.json
+    python benchmark.py --output results.json      # measure and compare, exit code 1 on a regression
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import timeit
+
+from batch_eval import BatchEvaluator
+from batch_solve import run_batch
+from freecell_bot import ALL_PILES, BoardState
+
+# Microsoft deals kept fixed so runs stay comparable; all but deal 12 solve within the node budget
+DEFAULT_CORPUS = [1, 2, 3, 7, 8, 10, 11, 12, 13, 15, 17, 18, 19, 20]
+DEFAULT_MAX_NODES = 5000
+DEFAULT_THRESHOLD = 0.10  # relative change that counts as a regression
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+MICRO_DEAL = 1
+MICRO_SETUP_MOVES = 30
+MICRO_REPEAT = 5
+MICRO_FRONTIER_SIZE = 512  # states scored per call in the batch evaluation benchmark
+
+# metric -> True when higher is better
+SOLVER_METRICS = {
+    "solved": True,
+    "nodes_per_second": True,
+    "total_time": False,
+    "mean_solution_length": False,
+    "total_nodes": False,
+    "max_peak_rss_mb": False,
+}
+
+
+def run_solver_benchmark(corpus, max_nodes=DEFAULT_MAX_NODES, workers=1):
+    """Solve every deal of the corpus and aggregate the records.
+    One fresh process per deal so each peak RSS belongs to its own deal"""
+    records = sorted(run_batch(corpus, workers, max_nodes, ms=True, fresh_workers=True), key=lambda r: r["seed"])
+    failed = [record for record in records if "error" in record]
+    if failed:
+        raise RuntimeError("Benchmark deals failed: " + ", ".join(f"{r['seed']}: {r['error']}" for r in failed))
+
+    solved = [record for record in records if record["solved"]]
+    total_time = sum(record["wall_time"] for record in records)
+    total_nodes = sum(record["nodes"] for record in records)
+
+    summary = {
+        "solved": len(solved),
+        "nodes_per_second": total_nodes / total_time if total_time else 0,
+        "total_time": total_time,
+        "mean_solution_length": sum(record["move_count"] for record in solved) / len(solved) if solved else 0,
+        "total_nodes": total_nodes,
+        "max_peak_rss_mb": max(record["peak_rss_mb"] for record in records),
+    }
+
+    deals = {
+        str(record["seed"]): {
+            "solved": record["solved"],
+            "time": record["wall_time"],
+            "nodes": record["nodes"],
+            "solution_length": record["move_count"],
+            "peak_rss_mb": record["peak_rss_mb"],
+        } for record in records
+    }
+    return summary, deals
+
+
+def micro_board():
+    """A mid-game position: a numbered deal with a few random legal moves played"""
+    board = BoardState.from_deal(MICRO_DEAL)
+    rng = random.Random(MICRO_DEAL)
+    for _ in range(MICRO_SETUP_MOVES):
+        moves = board.legal_moves()
+        rng.shuffle(moves)
+        for move in moves:
+            board.apply(move)
+            if board.legal_moves():
+                break
+            board.undo(move)  # never walk into a dead end, the benchmarks need moves to generate
+        else:
+            break
+    return board
+
+
+def micro_frontier():
+    """MICRO_FRONTIER_SIZE distinct positions, as a search frontier would hold"""
+    board = BoardState.from_deal(MICRO_DEAL)
+    rng = random.Random(MICRO_DEAL)
+    states = []
+    while len(states) < MICRO_FRONTIER_SIZE:
+        moves = board.legal_moves()
+        if not moves:
+            board = BoardState.from_deal(MICRO_DEAL)
+            continue
+        board.apply(rng.choice(moves))
+        states.append(board.clone())
+    return states
+
+
+def time_call(function, number):
+    """Best of MICRO_REPEAT runs, in microseconds per call"""
+    return min(timeit.repeat(function, number=number, repeat=MICRO_REPEAT)) / number * 1e6
+
+
+def run_micro_benchmarks():
+    board = micro_board()
+    board.calculate_heuristic(False)  # warm the per-pile cache like the search does
+
+    def move_generation():
+        board.legal_moves()
+
+    def apply_undo():
+        for move in board.legal_moves():
+            board.apply(move)
+            board.undo(move)
+
+    frontier = micro_frontier()
+    evaluator = BatchEvaluator()
+
+    def scalar_frontier():
+        for state in frontier:
+            state.dirty = ALL_PILES  # a fresh state has no cached pile scores
+            state.calculate_heuristic(False)
+
+    return {
+        "clone_us": time_call(board.clone, 20000),
+        "hash_us": time_call(board.__hash__, 200000),
+        "calculate_heuristic_us": time_call(lambda: board.calculate_heuristic(False), 5000),
+        "legal_moves_us": time_call(move_generation, 20000),
+        "apply_undo_all_moves_us": time_call(apply_undo, 5000),
+        "scalar_heuristic_per_state_us": time_call(scalar_frontier, 5) / len(frontier),
+        "batch_heuristic_per_state_us": time_call(lambda: evaluator.score_states(frontier), 5) / len(frontier),
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """List of regressions: metrics that got worse than the baseline by more than threshold"""
+    regressions = []
+
+    checks = [("solver", name, higher_better) for name, higher_better in SOLVER_METRICS.items()]
+    checks += [("micro", name, False) for name in results["micro"]]
+
+    for section, name, higher_better in checks:
+        old = baseline.get(section, {}).get(name)
+        new = results[section].get(name)
+        if not old or new is None:
+            continue
+
+        change = (new - old) / old
+        if (-change if higher_better else change) > threshold:
+            regressions.append({"metric": f"{section}.{name}", "baseline": old, "current": new,
+                                "change": round(change, 4)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the solver and compare with a baseline")
+    parser.add_argument("--deals", help="comma separated Microsoft deal numbers (default: built-in corpus)")
+    parser.add_argument("--max-nodes", type=int, default=DEFAULT_MAX_NODES)
+    parser.add_argument("--workers", type=int, default=1, help="parallel solves; more than 1 skews timings")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--output", help="write the results here")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--skip-solver", action="store_true", help="only run the micro-benchmarks")
+    args = parser.parse_args(argv)
+
+    corpus = [int(deal) for deal in args.deals.split(",")] if args.deals else DEFAULT_CORPUS
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "corpus": corpus,
+        "max_nodes": args.max_nodes,
+        "micro": run_micro_benchmarks(),
+    }
+    if args.skip_solver:
+        results["solver"], results["deals"] = {}, {}
+    else:
+        results["solver"], results["deals"] = run_solver_benchmark(corpus, args.max_nodes, args.workers)
+
+    for section in ("solver", "micro"):
+        for name, value in results[section].items():
+            print(f"{section}.{name}: {value:.2f}")
+
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as out:
+            json.dump(results, out, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline first")
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+
+    if baseline.get("corpus") != corpus or baseline.get("max_nodes") != args.max_nodes:
+        print("Warning: baseline was recorded on a different corpus or node budget")
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print("REGRESSION {metric}: {baseline:.2f} -> {current:.2f} ({change:+.1%})".format(**regression))
+    if not regressions:
+        print(f"No regressions beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
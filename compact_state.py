@@ -0,0 +1,725 @@
+from constants import *
+from freecell_bot import (Card, BoardState, look_ahead_score, heuristic_score, ZOBRIST_TABLEAU, ZOBRIST_FREECELL,
+                          ZOBRIST_FOUNDATION, SUIT_SWAPS, PHASE_WEIGHTS, PHASE_STAGNATION, MOVE_TO_FREECELL,
+                          MOVE_TO_TABLEAU, MOVE_TABLEAU_TO_TABLEAU, MOVE_TO_FOUNDATION, MOVE_FREECELL_TO_FOUNDATION,
+                          MOVE_SUPERMOVE, CAN_STACK, CARD_IS_RED, symmetric_key)
+
+# Integer card encoding: card = suit_index * 13 + (value - 1), suits ordered as in TYPES
+CARD_COUNT = 52
+EMPTY_CELL = 0xFF
+WIN_FOUNDATIONS = bytes([13] * len(TYPES))
+
+CARDS = tuple(Card(rank, suit) for suit in TYPES for rank in sorted(CARD_VALUES, key=CARD_VALUES.get))
+CARD_VALUE = bytes(card.value for card in CARDS)
+CARD_SUIT = bytes(TYPES.index(card.suit) for card in CARDS)
+CARD_RED = CARD_IS_RED
+
+
+def card_id(card):
+    """Integer id of a Card object (None for an empty slot)"""
+    if card is None:
+        return None
+    return card.id
+
+
+class CompactBoardState:
+    """Integer-encoded board with the same move/heuristic API as BoardState.
+
+    Each card is an int in 0..51, the tableau is a tuple of byte strings (bottom card first),
+    the free cells are a 4-byte field (EMPTY_CELL marks a free slot) and the foundations are
+    four rank counters. All three are immutable, so clone() only copies references."""
+
+    __slots__ = ('tableau', 'free_cells', 'foundations', 'key', 'sym_key', 'pile_keys', 'cell_key', 'move_count',
+                 'move_log', 'starting_point', 'current_weights', 'stagnation_threshold', 'phase_weights',
+                 'phase_stagnation')
+
+    def __init__(self, tableau=None, free_cells=None, foundations=None):
+        self.tableau = tableau if tableau is not None else tuple(bytes() for _ in range(TABLEAU_COUNT))
+        self.free_cells = free_cells if free_cells is not None else bytes([EMPTY_CELL] * FREECELL_COUNT)
+        self.foundations = foundations if foundations is not None else bytes(len(TYPES))
+        self.rehash()
+        self.move_count = 0
+        self.move_log = []
+        self.starting_point = False
+
+        self.phase_weights = PHASE_WEIGHTS
+        self.phase_stagnation = PHASE_STAGNATION
+        self.update_weights()
+
+    @classmethod
+    def from_board_state(cls, board):
+        """Build a compact state from a BoardState"""
+        state = cls(
+            tuple(bytes(card_id(card) for card in pile) for pile in board.tableau),
+            bytes(EMPTY_CELL if card is None else card_id(card) for card in board.free_cells),
+            bytes(len(board.foundations[suit]) for suit in TYPES),
+        )
+        state.move_count = board.move_count
+        state.move_log = list(board.move_log)
+        state.starting_point = board.starting_point
+        return state
+
+    def to_board_state(self):
+        """Build an equivalent BoardState made of Card objects"""
+        board = BoardState(
+            [[CARDS[card] for card in pile] for pile in self.tableau],
+            [None if card == EMPTY_CELL else CARDS[card] for card in self.free_cells],
+            {suit: list(CARDS[s * 13:s * 13 + self.foundations[s]]) for s, suit in enumerate(TYPES)},
+            initialize_deck=False
+        )
+        board.move_count = self.move_count
+        board.move_log = list(self.move_log)
+        board.starting_point = self.starting_point
+        board.update_weights()
+        return board
+
+    def compute_key(self, symmetric=False, suits=SUIT_SWAPS[0]):
+        """Full Zobrist key, using the same tables as BoardState so both engines agree on keys"""
+        if symmetric:
+            return symmetric_key(*self.symmetric_key_parts(suits))
+
+        key = 0
+        for i, pile in enumerate(self.tableau):
+            for depth, card in enumerate(pile):
+                key ^= ZOBRIST_TABLEAU[i][depth][suits[CARD_SUIT[card]] * 13 + card % 13]
+        for i, card in enumerate(self.free_cells):
+            if card != EMPTY_CELL:
+                key ^= ZOBRIST_FREECELL[i][suits[CARD_SUIT[card]] * 13 + card % 13]
+        for s, level in enumerate(self.foundations):
+            key ^= ZOBRIST_FOUNDATION[suits[s]][level]
+        return key
+
+    def symmetric_key_parts(self, suits=SUIT_SWAPS[0]):
+        """See BoardState.symmetric_key_parts; the column keys are a tuple here"""
+        pile_keys = []
+        for pile in self.tableau:
+            key = 0
+            for depth, card in enumerate(pile):
+                key ^= ZOBRIST_TABLEAU[0][depth][suits[CARD_SUIT[card]] * 13 + card % 13]
+            pile_keys.append(key)
+
+        cell_key = 0
+        for card in self.free_cells:
+            if card != EMPTY_CELL:
+                cell_key ^= ZOBRIST_FREECELL[0][suits[CARD_SUIT[card]] * 13 + card % 13]
+        for s, level in enumerate(self.foundations):
+            cell_key ^= ZOBRIST_FOUNDATION[suits[s]][level]
+        return tuple(pile_keys), cell_key
+
+    def rehash(self):
+        self.key = self.compute_key()
+        self.pile_keys, self.cell_key = self.symmetric_key_parts()
+        self.sym_key = None
+
+    def _toggle_pile_key(self, tableau_idx, delta):
+        """XOR delta (cards at their depths, from ZOBRIST_TABLEAU[0]) into a column key"""
+        pile_keys = list(self.pile_keys)
+        pile_keys[tableau_idx] ^= delta
+        self.pile_keys = tuple(pile_keys)
+        self.sym_key = None
+
+    def _toggle_cell_key(self, delta):
+        """XOR delta into the free cell and foundation part of the symmetric key"""
+        self.cell_key ^= delta
+        self.sym_key = None
+
+    def canonical_key(self, suit_swap=False):
+        """See BoardState.canonical_key"""
+        if not suit_swap:
+            if self.sym_key is None:
+                self.sym_key = symmetric_key(self.pile_keys, self.cell_key)
+            return self.sym_key
+        return min(self.compute_key(True, suits) for suits in SUIT_SWAPS)
+
+    def position_code(self):
+        """See BoardState.position_code"""
+        cells = bytes(sorted(card for card in self.free_cells if card != EMPTY_CELL))
+        return b"\xff".join(sorted(self.tableau)) + b"\xfe" + cells
+
+    def transposition_key(self):
+        if CANONICAL_DEDUPE:
+            return self.canonical_key(SUIT_SWAP_DEDUPE)
+        return self.key
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactBoardState):
+            return False
+        return (self.key == other.key and self.foundations == other.foundations
+                and self.free_cells == other.free_cells and self.tableau == other.tableau)
+
+    def __hash__(self):
+        return self.key
+
+    def set_starting_point(self):
+        self.starting_point = True
+
+    def is_starting_point(self):
+        return self.starting_point
+
+    def set_move_count(self, move_count):
+        self.move_count = move_count
+
+    def get_game_phase(self):
+        foundation_progress = sum(self.foundations) / 52
+
+        if foundation_progress < 0.2:
+            return "early"
+        elif foundation_progress < 0.7:
+            return "mid"
+        else:
+            return "late"
+
+    def update_weights(self):
+        phase = self.get_game_phase()
+        self.stagnation_threshold = self.phase_stagnation[phase]
+        self.current_weights = self.phase_weights[phase]
+
+    def display(self):
+        self.to_board_state().display()
+
+    def _set_pile(self, tableau_idx, pile):
+        tableau = list(self.tableau)
+        tableau[tableau_idx] = pile
+        self.tableau = tuple(tableau)
+
+    def _set_cell(self, freecell_idx, card):
+        free_cells = bytearray(self.free_cells)
+        free_cells[freecell_idx] = card
+        self.free_cells = bytes(free_cells)
+
+    def _add_to_foundation(self, card):
+        suit = CARD_SUIT[card]
+        foundations = bytearray(self.foundations)
+        delta = ZOBRIST_FOUNDATION[suit][foundations[suit]] ^ ZOBRIST_FOUNDATION[suit][foundations[suit] + 1]
+        self.key ^= delta
+        self._toggle_cell_key(delta)
+        foundations[suit] += 1
+        self.foundations = bytes(foundations)
+        self.update_weights()
+
+    # Heuristic components, mirroring BoardState on integer cards
+
+    def get_foundation_score(self):
+        return sum(self.foundations) * self.current_weights.FOUNDATION_MULTIPLIER
+
+    def get_free_cell_score(self):
+        return self.free_cells.count(EMPTY_CELL) * self.current_weights.FREECELL_MULTIPLIER
+
+    def get_tableau_order_score(self):
+        score = 0
+        for pile in self.tableau:
+            if pile and self.is_valid_sequence(pile):
+                score += len(pile) * self.current_weights.ORDER_MULTIPLIER
+        return score
+
+    def card_excavation_score(self):
+        score = 0
+
+        for s in range(len(TYPES)):
+            if self.foundations[s] >= 13: continue
+            needed = s * 13 + self.foundations[s]
+
+            for pile in self.tableau:
+                index = pile.find(needed)
+                if index == -1: continue
+
+                score += s * 2
+                score += self.current_weights.CARD_EXCAVATION_MULTIPLIER / (len(pile) - index)
+                break
+
+        return score
+
+    def closest_card_score(self):
+        dist = 100000
+
+        for s in range(len(TYPES)):
+            if self.foundations[s] >= 13: continue
+            needed = s * 13 + self.foundations[s]
+
+            for pile in self.tableau:
+                index = pile.find(needed)
+                if index == -1: continue
+
+                dist = min(dist, len(pile) - index)
+                break
+
+        return 80 / dist
+
+    def get_tableau_empty_score(self):
+        score = 0
+        for pile in self.tableau:
+            if len(pile) == 0:
+                score += self.current_weights.TABLEAU_EMPTY_SCORE * 2
+            else:
+                score += self.current_weights.TABLEAU_EMPTY_SCORE / len(pile)
+        return score
+
+    def get_sequential_chains_score(self):
+        score = 0
+        for pile in self.tableau:
+            if len(pile) <= 1:
+                continue
+
+            current_chain = 1
+            longest_chain = 1
+            for i in range(1, len(pile)):
+                if CAN_STACK[pile[i]][pile[i - 1]]:
+                    current_chain += 1
+                    longest_chain = max(longest_chain, current_chain)
+                else:
+                    current_chain = 1
+
+            chain_score = longest_chain ** 1.5 * self.current_weights.CHAIN_MULTIPLIER
+
+            if longest_chain > 1 and self.can_go_to_foundation(pile[-1]):
+                chain_score *= 1.3
+
+            score += chain_score
+        return score
+
+    def get_blocked_cards_penalty(self):
+        penalty = 0
+
+        needed_cards = {s * 13 + level for s, level in enumerate(self.foundations) if level < 13}
+
+        for pile in self.tableau:
+            for i, card in enumerate(pile):
+                if card not in needed_cards: continue
+
+                cards_above = len(pile) - i - 1
+                if cards_above > 0:
+                    penalty += cards_above * self.current_weights.BLOCKED_CARD_PENALTY
+
+                    for j in range(i + 1, len(pile)):
+                        if CARD_RED[pile[j]] == CARD_RED[card]:
+                            penalty += self.current_weights.SAME_COLOR_BLOCK_PENALTY
+
+        return penalty
+
+    def get_balanced_foundation_score(self):
+        foundation_heights = list(self.foundations)
+        avg_height = sum(foundation_heights) / len(foundation_heights)
+
+        variance = sum((h - avg_height) ** 2 for h in foundation_heights) / len(foundation_heights)
+        std_dev = variance ** 0.5
+
+        balance_score = (5 - std_dev) * self.current_weights.BALANCE_MULTIPLIER
+        return max(0, balance_score)
+
+    def can_go_to_foundation(self, card):
+        return CARD_VALUE[card] == self.foundations[CARD_SUIT[card]] + 1
+
+    def get_potential_moves_score(self):
+        potential_moves = 0
+        has_empty = any(len(pile) == 0 for pile in self.tableau)
+
+        for i in range(TABLEAU_COUNT):
+            if not self.tableau[i]:
+                continue
+
+            bottom_card = self.tableau[i][-1]
+
+            if has_empty:
+                potential_moves += 1
+
+            for j in range(TABLEAU_COUNT):
+                if i == j or not self.tableau[j]:
+                    continue
+
+                if CAN_STACK[bottom_card][self.tableau[j][-1]]:
+                    potential_moves += 1
+
+        return potential_moves * self.current_weights.POTENTIAL_MOVE_MULTIPLIER
+
+    def improved_look_ahead_score_boost(self, context, max_depth=3, current_depth=0, visited=None, alpha=-float('inf'),
+                                        beta=float('inf')):
+        return look_ahead_score(self, context, max_depth, current_depth, visited, alpha, beta)
+
+    def calculate_heuristic(self, apply_bonus=True, context=None):
+        return heuristic_score(self, apply_bonus, context)
+
+    # Moves
+
+    def move_to_freecell(self, tableau_idx):
+        pile = self.tableau[tableau_idx]
+        if not pile:
+            return False
+
+        i = self.free_cells.find(EMPTY_CELL)
+        if i == -1:
+            return False
+
+        card = pile[-1]
+        self._set_pile(tableau_idx, pile[:-1])
+        self._set_cell(i, card)
+        self.key ^= ZOBRIST_TABLEAU[tableau_idx][len(pile) - 1][card] ^ ZOBRIST_FREECELL[i][card]
+        self._toggle_pile_key(tableau_idx, ZOBRIST_TABLEAU[0][len(pile) - 1][card])
+        self._toggle_cell_key(ZOBRIST_FREECELL[0][card])
+        self.move_log.append((MOVE_TO_FREECELL, tableau_idx, i, 1, CARDS[card]))
+        self.move_count += 1
+        return True
+
+    def move_to_tableau(self, freecell_idx, tableau_idx):
+        card = self.free_cells[freecell_idx]
+        if card != EMPTY_CELL and self.is_valid_tableau_move(tableau_idx, card):
+            depth = len(self.tableau[tableau_idx])
+            self.key ^= ZOBRIST_TABLEAU[tableau_idx][depth][card] ^ ZOBRIST_FREECELL[freecell_idx][card]
+            self._toggle_pile_key(tableau_idx, ZOBRIST_TABLEAU[0][depth][card])
+            self._toggle_cell_key(ZOBRIST_FREECELL[0][card])
+            self._set_pile(tableau_idx, self.tableau[tableau_idx] + bytes((card,)))
+            self._set_cell(freecell_idx, EMPTY_CELL)
+            self.move_log.append((MOVE_TO_TABLEAU, freecell_idx, tableau_idx, 1, CARDS[card]))
+            self.move_count += 1
+            return True
+        return False
+
+    def move_tableau_to_tableau(self, from_idx, to_idx):
+        pile = self.tableau[from_idx]
+        if pile:
+            card = pile[-1]
+            if self.is_valid_tableau_move(to_idx, card):
+                to_depth = len(self.tableau[to_idx])
+                self.key ^= ZOBRIST_TABLEAU[from_idx][len(pile) - 1][card] ^ ZOBRIST_TABLEAU[to_idx][to_depth][card]
+                self._toggle_pile_key(from_idx, ZOBRIST_TABLEAU[0][len(pile) - 1][card])
+                self._toggle_pile_key(to_idx, ZOBRIST_TABLEAU[0][to_depth][card])
+                tableau = list(self.tableau)
+                tableau[from_idx] = pile[:-1]
+                tableau[to_idx] = tableau[to_idx] + bytes((card,))
+                self.tableau = tuple(tableau)
+                self.move_log.append((MOVE_TABLEAU_TO_TABLEAU, from_idx, to_idx, 1, CARDS[card]))
+                self.move_count += 1
+                return True
+        return False
+
+    def is_valid_tableau_move(self, tableau_idx, card):
+        pile = self.tableau[tableau_idx]
+        if not pile:
+            return True
+        return CAN_STACK[card][pile[-1]]
+
+    def move_to_foundation(self, tableau_idx):
+        pile = self.tableau[tableau_idx]
+        if pile:
+            card = pile[-1]
+            if self.is_valid_foundation_move(card):
+                self._add_to_foundation(card)
+                self._set_pile(tableau_idx, pile[:-1])
+                self.key ^= ZOBRIST_TABLEAU[tableau_idx][len(pile) - 1][card]
+                self._toggle_pile_key(tableau_idx, ZOBRIST_TABLEAU[0][len(pile) - 1][card])
+                self.move_log.append((MOVE_TO_FOUNDATION, tableau_idx, CARD_SUIT[card], 1, CARDS[card]))
+                self.move_count += 1
+                return True
+        return False
+
+    def move_freecell_to_foundation(self, freecell_idx):
+        card = self.free_cells[freecell_idx]
+        if card != EMPTY_CELL and self.is_valid_foundation_move(card):
+            self._add_to_foundation(card)
+            self._set_cell(freecell_idx, EMPTY_CELL)
+            self.key ^= ZOBRIST_FREECELL[freecell_idx][card]
+            self._toggle_cell_key(ZOBRIST_FREECELL[0][card])
+            self.move_log.append((MOVE_FREECELL_TO_FOUNDATION, freecell_idx, CARD_SUIT[card], 1, CARDS[card]))
+            self.move_count += 1
+            return True
+        return False
+
+    def is_valid_foundation_move(self, card):
+        return self.can_go_to_foundation(card)
+
+    def get_empty_cells_and_cascades(self):
+        empty_cells = self.free_cells.count(EMPTY_CELL)
+        empty_cascades = sum(1 for pile in self.tableau if not pile)
+        return empty_cells, empty_cascades
+
+    def max_supermove(self, to_empty_column=False):
+        """See BoardState.max_supermove"""
+        empty_cells, empty_cascades = self.get_empty_cells_and_cascades()
+        if to_empty_column:
+            empty_cascades -= 1
+        return (empty_cells + 1) * (2 ** empty_cascades)
+
+    def top_run_length(self, tableau_idx):
+        """Number of cards in the in-sequence run on top of a pile"""
+        pile = self.tableau[tableau_idx]
+        run = 1 if pile else 0
+        while run < len(pile) and CAN_STACK[pile[-run]][pile[-run - 1]]:
+            run += 1
+        return run
+
+    def move_supermove(self, source_tableau_idx, target_tableau_idx, no_cards):
+        source = self.tableau[source_tableau_idx]
+        if source_tableau_idx == target_tableau_idx or no_cards <= 0 or no_cards > len(source):
+            return False
+
+        cards_to_move = source[-no_cards:]
+
+        if len(cards_to_move) > self.max_supermove(not self.tableau[target_tableau_idx]):
+            return False
+
+        if not self.is_valid_sequence(cards_to_move):
+            return False
+
+        if not self.is_valid_tableau_move(target_tableau_idx, cards_to_move[0]):
+            return False
+
+        target = self.tableau[target_tableau_idx]
+        from_delta = to_delta = 0
+        for offset, card in enumerate(cards_to_move):
+            from_depth = len(source) - no_cards + offset
+            to_depth = len(target) + offset
+            self.key ^= ZOBRIST_TABLEAU[source_tableau_idx][from_depth][card]
+            self.key ^= ZOBRIST_TABLEAU[target_tableau_idx][to_depth][card]
+            from_delta ^= ZOBRIST_TABLEAU[0][from_depth][card]
+            to_delta ^= ZOBRIST_TABLEAU[0][to_depth][card]
+        self._toggle_pile_key(source_tableau_idx, from_delta)
+        self._toggle_pile_key(target_tableau_idx, to_delta)
+
+        tableau = list(self.tableau)
+        tableau[source_tableau_idx] = source[:-no_cards]
+        tableau[target_tableau_idx] = target + cards_to_move
+        self.tableau = tuple(tableau)
+        self.move_log.append((MOVE_SUPERMOVE, source_tableau_idx, target_tableau_idx, no_cards,
+                              CARDS[cards_to_move[0]]))
+        self.move_count += 1
+        return True
+
+    def is_valid_sequence(self, cards_to_move):
+        """Check if the cards form a valid sequence in the tableau"""
+        for i in range(1, len(cards_to_move)):
+            if not CAN_STACK[cards_to_move[i]][cards_to_move[i - 1]]:
+                return False
+        return True
+
+    def legal_moves(self):
+        """See BoardState.legal_moves"""
+        moves = []
+        empty_cell = self.free_cells.find(EMPTY_CELL)
+        first_empty = self.tableau.index(b'') if b'' in self.tableau else None
+        capacity = self.max_supermove()
+        empty_capacity = self.max_supermove(True) if first_empty is not None else 0
+
+        for i in range(TABLEAU_COUNT):
+            pile = self.tableau[i]
+
+            if pile and empty_cell != -1:
+                moves.append((MOVE_TO_FREECELL, i, empty_cell))
+
+            for o in range(FREECELL_COUNT):
+                card = self.free_cells[o]
+                if card != EMPTY_CELL and self.is_valid_tableau_move(i, card):
+                    moves.append((MOVE_TO_TABLEAU, o, i))
+
+            if not pile:
+                continue
+
+            card = pile[-1]
+            if self.can_go_to_foundation(card):
+                moves.append((MOVE_TO_FOUNDATION, i, CARD_SUIT[card]))
+
+            run = self.top_run_length(i)
+
+            for o in range(TABLEAU_COUNT):
+                if i == o: continue
+
+                if self.is_valid_tableau_move(o, card):
+                    moves.append((MOVE_TABLEAU_TO_TABLEAU, i, o))
+
+                if run < 2: continue
+
+                target = self.tableau[o]
+                if target:
+                    count = CARD_VALUE[target[-1]] - CARD_VALUE[card]
+                    if 2 <= count <= min(run, capacity) and CAN_STACK[pile[-count]][target[-1]]:
+                        moves.append((MOVE_SUPERMOVE, i, o, count))
+                elif o == first_empty and len(pile) > 1:
+                    for count in range(2, min(run, empty_capacity, len(pile) - 1) + 1):
+                        moves.append((MOVE_SUPERMOVE, i, o, count))
+
+        for o in range(FREECELL_COUNT):
+            card = self.free_cells[o]
+            if card != EMPTY_CELL and self.can_go_to_foundation(card):
+                moves.append((MOVE_FREECELL_TO_FOUNDATION, o, CARD_SUIT[card]))
+
+        return moves
+
+    def foundation_moves(self):
+        """See BoardState.foundation_moves"""
+        moves = []
+        for s, level in enumerate(self.foundations):
+            if level >= 13:
+                continue
+
+            needed = s * 13 + level
+            cell = self.free_cells.find(needed)
+            if cell != -1:
+                moves.append((MOVE_FREECELL_TO_FOUNDATION, cell, s))
+                continue
+
+            for i, pile in enumerate(self.tableau):
+                if pile and pile[-1] == needed:
+                    moves.append((MOVE_TO_FOUNDATION, i, s))
+                    break
+        return moves
+
+    def is_safe_foundation_move(self, card):
+        """See BoardState.is_safe_foundation_move"""
+        value = CARD_VALUE[card]
+        if value <= 2:
+            return True
+
+        opposite = (2, 3) if CARD_SUIT[card] < 2 else (0, 1)
+        return all(self.foundations[s] >= value - 1 for s in opposite)
+
+    def auto_play(self):
+        played = []
+
+        progress = True
+        while progress:
+            progress = False
+            for move in self.foundation_moves():
+                if move[0] == MOVE_TO_FOUNDATION:
+                    card = self.tableau[move[1]][-1]
+                else:
+                    card = self.free_cells[move[1]]
+
+                if self.is_safe_foundation_move(card):
+                    self.apply(move)
+                    played.append(move)
+                    progress = True
+
+        return played
+
+    def apply_with_auto_play(self, move):
+        self.apply(move)
+        if AUTO_PLAY_SAFE_MOVES:
+            return [move] + self.auto_play()
+        return [move]
+
+    def undo_all(self, moves):
+        for move in reversed(moves):
+            self.undo(move)
+
+    def apply(self, move):
+        kind, source, target = move[0], move[1], move[2]
+
+        if kind == MOVE_TO_FREECELL:
+            return self.move_to_freecell(source)
+        if kind == MOVE_TO_TABLEAU:
+            return self.move_to_tableau(source, target)
+        if kind == MOVE_TABLEAU_TO_TABLEAU:
+            return self.move_tableau_to_tableau(source, target)
+        if kind == MOVE_TO_FOUNDATION:
+            return self.move_to_foundation(source)
+        if kind == MOVE_SUPERMOVE:
+            return self.move_supermove(source, target, move[3])
+        return self.move_freecell_to_foundation(source)
+
+    def undo(self, move):
+        kind, source, target = move[0], move[1], move[2]
+
+        if kind == MOVE_TO_FREECELL:
+            card = self.free_cells[target]
+            self.key ^= ZOBRIST_FREECELL[target][card] ^ ZOBRIST_TABLEAU[source][len(self.tableau[source])][card]
+            self._toggle_cell_key(ZOBRIST_FREECELL[0][card])
+            self._toggle_pile_key(source, ZOBRIST_TABLEAU[0][len(self.tableau[source])][card])
+            self._set_cell(target, EMPTY_CELL)
+            self._set_pile(source, self.tableau[source] + bytes((card,)))
+
+        elif kind == MOVE_TO_TABLEAU:
+            pile = self.tableau[target]
+            card = pile[-1]
+            self.key ^= ZOBRIST_TABLEAU[target][len(pile) - 1][card] ^ ZOBRIST_FREECELL[source][card]
+            self._toggle_pile_key(target, ZOBRIST_TABLEAU[0][len(pile) - 1][card])
+            self._toggle_cell_key(ZOBRIST_FREECELL[0][card])
+            self._set_pile(target, pile[:-1])
+            self._set_cell(source, card)
+
+        elif kind == MOVE_TABLEAU_TO_TABLEAU:
+            pile = self.tableau[target]
+            card = pile[-1]
+            source_depth = len(self.tableau[source])
+            self.key ^= ZOBRIST_TABLEAU[target][len(pile) - 1][card] ^ ZOBRIST_TABLEAU[source][source_depth][card]
+            self._toggle_pile_key(target, ZOBRIST_TABLEAU[0][len(pile) - 1][card])
+            self._toggle_pile_key(source, ZOBRIST_TABLEAU[0][source_depth][card])
+            tableau = list(self.tableau)
+            tableau[target] = pile[:-1]
+            tableau[source] = tableau[source] + bytes((card,))
+            self.tableau = tuple(tableau)
+
+        elif kind == MOVE_SUPERMOVE:
+            from_pile, to_pile = self.tableau[target], self.tableau[source]
+            base = len(from_pile) - move[3]
+            from_delta = to_delta = 0
+            for offset, card in enumerate(from_pile[base:]):
+                self.key ^= ZOBRIST_TABLEAU[target][base + offset][card]
+                self.key ^= ZOBRIST_TABLEAU[source][len(to_pile) + offset][card]
+                from_delta ^= ZOBRIST_TABLEAU[0][base + offset][card]
+                to_delta ^= ZOBRIST_TABLEAU[0][len(to_pile) + offset][card]
+            self._toggle_pile_key(target, from_delta)
+            self._toggle_pile_key(source, to_delta)
+            tableau = list(self.tableau)
+            tableau[target] = from_pile[:base]
+            tableau[source] = to_pile + from_pile[base:]
+            self.tableau = tuple(tableau)
+
+        else:
+            level = self.foundations[target]
+            card = target * 13 + level - 1
+            delta = ZOBRIST_FOUNDATION[target][level] ^ ZOBRIST_FOUNDATION[target][level - 1]
+            self.key ^= delta
+            self._toggle_cell_key(delta)
+            foundations = bytearray(self.foundations)
+            foundations[target] -= 1
+            self.foundations = bytes(foundations)
+            self.update_weights()
+
+            if kind == MOVE_TO_FOUNDATION:
+                depth = len(self.tableau[source])
+                self.key ^= ZOBRIST_TABLEAU[source][depth][card]
+                self._toggle_pile_key(source, ZOBRIST_TABLEAU[0][depth][card])
+                self._set_pile(source, self.tableau[source] + bytes((card,)))
+            else:
+                self.key ^= ZOBRIST_FREECELL[source][card]
+                self._toggle_cell_key(ZOBRIST_FREECELL[0][card])
+                self._set_cell(source, card)
+
+        self.move_count -= 1
+        self.move_log.pop()
+
+    def clone(self):
+        """Piles, cells and foundations are immutable, so the copy shares them"""
+        new_state = CompactBoardState.__new__(CompactBoardState)
+        new_state.tableau = self.tableau
+        new_state.free_cells = self.free_cells
+        new_state.foundations = self.foundations
+        new_state.key = self.key
+        new_state.sym_key = self.sym_key
+        new_state.pile_keys = self.pile_keys
+        new_state.cell_key = self.cell_key
+        new_state.move_count = self.move_count
+        new_state.move_log = []
+        new_state.starting_point = False
+        new_state.current_weights = self.current_weights
+        new_state.stagnation_threshold = self.stagnation_threshold
+        new_state.phase_weights = self.phase_weights
+        new_state.phase_stagnation = self.phase_stagnation
+        return new_state
+
+    def cards_left(self):
+        return 52 - sum(self.foundations)
+
+    def out_of_order_cards(self):
+        """See BoardState.out_of_order_cards"""
+        count = 0
+        for pile in self.tableau:
+            lowest = 14
+            for card in pile:
+                value = CARD_VALUE[card]
+                if value > lowest:
+                    count += 1
+                else:
+                    lowest = value
+        return count
+
+    def is_winner(self):
+        return self.foundations == WIN_FOUNDATIONS
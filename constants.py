@@ -9,6 +9,37 @@ CARD_STRING_SIZE = 24
 FREECELL_COUNT = 4
 VICTORY_SCORE = 99999999999
 
+# Duplicate detection
+CANONICAL_DEDUPE = True  # positions that only differ by column or free cell order count as duplicates
+SUIT_SWAP_DEDUPE = False  # also collapse swaps of the two same-colour suits (keys are rebuilt, so slower)
+MIX_CACHE_SIZE = 1 << 16  # mixed column keys remembered for the symmetric key (LRU)
+
+# Play foundation moves that can never hurt straight after every search move
+AUTO_PLAY_SAFE_MOVES = True
+
+# Score queued children from their parent; the full heuristic runs only when they reach the front
+LAZY_CHILD_SCORING = True
+
+# Look-ahead results remembered per search (LRU); 0 disables the table
+LOOK_AHEAD_TABLE_SIZE = 200000
+
+# Parallel hint: every root move is searched on a process pool until the time budget runs out
+HINT_SEARCH_DEPTH = 4
+HINT_TIME_BUDGET = 0.8  # seconds
+HINT_WORKERS = None  # None uses every core
+
+# GUI hint pondering: searches the player's position on the hint pool while they think, then the positions the
+# hints lead to, deepening one ply at a time
+PONDER_MAX_DEPTH = 6
+PONDER_FOLLOW_PLIES = 3  # hinted moves followed ahead of the player before deepening the current position again
+PONDER_TASK_BUDGET = 2.0  # seconds a single root move search may take, counted from when it starts
+HINT_CACHE_SIZE = 2000  # positions whose best move is remembered (LRU)
+
+# Bounded open list: None keeps every generated node
+MAX_FRONTIER_SIZE = None
+FRONTIER_TRIM_SLACK = 0.1  # let the queue overshoot by this fraction before evicting, so trims are rare
+FRONTIER_NODE_BYTES = 9 * 1024  # measured average cost of a queued node, used to turn a memory budget into a size
+
 # Default weights (fallback)
 DEFAULT_WEIGHTS = {
     # Original weights
@@ -78,4 +109,7 @@ WEIGHT_PROFILES = {
 
 STAGNATION_THRESHOLD_EARLY = 10
 STAGNATION_THRESHOLD_MID = 50
-STAGNATION_THRESHOLD_LATE = 100
\ No newline at end of file
+STAGNATION_THRESHOLD_LATE = 100
+STAGNATION_WINDOW = 10  # number of recent scores compared to detect stagnation
+
+STATS_FRONTIER_INTERVAL = 100  # expansions between frontier size samples when search stats are collected
@@ -0,0 +1,40 @@
+# deals.py
+"""Numbered deals compatible with Microsoft FreeCell (#1 - #32000, and beyond: any non-negative 31-bit number).
+
+The original game seeds the Microsoft C runtime rand() with the deal number and shuffles a deck ordered
+A-clubs, A-diamonds, A-hearts, A-spades, 2-clubs, ... K-spades, then deals it row by row over the 8 columns.
+"""
+from constants import TABLEAU_COUNT
+
+MS_DECK_RANKS = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+MS_DECK_SUITS = ['Clubs', 'Diamonds', 'Hearts', 'Spades']
+MAX_DEAL_NUMBER = 0x7FFFFFFF
+
+
+def ms_rand(seed):
+    """Microsoft C runtime rand() sequence for a seed"""
+    state = seed
+    while True:
+        state = (state * 214013 + 2531011) & 0x7FFFFFFF
+        yield state >> 16
+
+
+def ms_deck_order(deal_number):
+    """Card indices (rank * 4 + suit, in MS_DECK order) in the order they are dealt"""
+    if not 0 <= deal_number <= MAX_DEAL_NUMBER:
+        raise ValueError(f"Deal number must be between 0 and {MAX_DEAL_NUMBER}, got {deal_number}")
+
+    cards = list(range(51, -1, -1))
+    rand = ms_rand(deal_number)
+    for i in range(52):
+        j = 51 - next(rand) % (52 - i)
+        cards[i], cards[j] = cards[j], cards[i]
+    return cards
+
+
+def deal_columns(deal_number):
+    """The 8 tableau columns of a deal as lists of (rank, suit), bottom card first"""
+    columns = [[] for _ in range(TABLEAU_COUNT)]
+    for position, card in enumerate(ms_deck_order(deal_number)):
+        columns[position % TABLEAU_COUNT].append((MS_DECK_RANKS[card // 4], MS_DECK_SUITS[card % 4]))
+    return columns
@@ -10,14 +10,465 @@ import os
 
 from colorama import Fore, Style
 import heapq
+from collections import OrderedDict
+from functools import lru_cache
 from constants import *
+from deals import deal_columns
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+_hint_pool = None  # created on the first parallel hint and reused, so only the first hint pays the process start
+
+
+# Zobrist keys: one random 64-bit value per (location, card), seeded so keys are stable across runs
+ZOBRIST_MAX_DEPTH = 52
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST_TABLEAU = [[[_zobrist_random.getrandbits(64) for _ in range(52)] for _ in range(ZOBRIST_MAX_DEPTH)]
+                   for _ in range(TABLEAU_COUNT)]
+ZOBRIST_FREECELL = [[_zobrist_random.getrandbits(64) for _ in range(52)] for _ in range(FREECELL_COUNT)]
+ZOBRIST_FOUNDATION = [[_zobrist_random.getrandbits(64) for _ in range(14)] for _ in TYPES]
+MASK64 = (1 << 64) - 1
+
+
+@lru_cache(maxsize=MIX_CACHE_SIZE)
+def mix_key(key):
+    """splitmix64 finaliser, applied to every column key before the columns are summed into the symmetric key.
+    Unmixed, the columns would only add up to the XOR of all their cards, which forgets which column holds what.
+    Cached: a search keeps coming back to the same few thousand column contents"""
+    key = (key ^ (key >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    key = (key ^ (key >> 27)) * 0x94D049BB133111EB & MASK64
+    return key ^ (key >> 31)
+
+
+def symmetric_key(pile_keys, cell_key):
+    """Key of a position up to column and free cell order: the sum of the mixed column keys does not depend on
+    the column order, and cell_key (free cells and foundations) hashes every cell with the same table"""
+    return (sum(map(mix_key, pile_keys)) + cell_key) & MASK64
+
+# Weights are built once per phase and shared by every state in that phase
+PHASE_WEIGHTS = {phase: SimpleNamespace(**{**DEFAULT_WEIGHTS, **WEIGHT_PROFILES[phase]}) for phase in WEIGHT_PROFILES}
+PHASE_STAGNATION = {
+    'early': STAGNATION_THRESHOLD_EARLY,
+    'mid': STAGNATION_THRESHOLD_MID,
+    'late': STAGNATION_THRESHOLD_LATE,
+}
+
+ALL_PILES = (1 << TABLEAU_COUNT) - 1
+FREECELL_PILE = -1  # pile index used in the location index for cards sitting in a free cell
+
+# Lookup tables indexed by card id (suit index * 13 + value - 1, red suits are ids 26..51)
+CARD_IS_RED = tuple(card_id >= 26 for card_id in range(52))
+CAN_STACK = tuple(tuple(card % 13 == target % 13 - 1 and CARD_IS_RED[card] != CARD_IS_RED[target]
+                        for target in range(52))
+                  for card in range(52))  # CAN_STACK[card][target]: card may go on target in the tableau
+
+# Move descriptors are (kind, source, target) tuples, supermoves add the number of cards moved
+MOVE_TO_FREECELL = 0             # tableau source -> free cell target
+MOVE_TO_TABLEAU = 1              # free cell source -> tableau target
+MOVE_TABLEAU_TO_TABLEAU = 2      # tableau source -> tableau target
+MOVE_TO_FOUNDATION = 3           # tableau source -> foundation of suit index target
+MOVE_FREECELL_TO_FOUNDATION = 4  # free cell source -> foundation of suit index target
+MOVE_SUPERMOVE = 5               # sequence of cards from tableau source -> tableau target
+
+# Suit permutations that keep the rules intact: identity, swap the black suits, swap the red suits, both
+SUIT_SWAPS = ((0, 1, 2, 3), (1, 0, 2, 3), (0, 1, 3, 2), (1, 0, 3, 2))
+
+
+def describe_move(record):
+    """Text of a move log record (kind, source, target, count, card)"""
+    kind, source, target, count, card = record
+    if kind == MOVE_TO_FREECELL:
+        return f"Moved {card} to free cell {target + 1}"
+    if kind == MOVE_TO_TABLEAU:
+        return f"Moved {card} to tableau {target + 1}"
+    if kind == MOVE_TABLEAU_TO_TABLEAU:
+        return f"Moved {card} from tableau {source + 1} to {target + 1}"
+    if kind == MOVE_SUPERMOVE:
+        return f"Moved {count} cards from tableau {source + 1} to tableau {target + 1}"
+    return f"Moved {card} to foundation {card.suit}"
+
+
+def get_hint_pool():
+    global _hint_pool
+    if _hint_pool is None:
+        # spawn keeps workers independent of the GUI process state (pygame, bot thread) on every platform
+        _hint_pool = ProcessPoolExecutor(max_workers=HINT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _hint_pool
+
+
+def shutdown_hint_pool():
+    global _hint_pool
+    if _hint_pool is not None:
+        _hint_pool.shutdown(wait=False, cancel_futures=True)
+        _hint_pool = None
+
+
+def search_subtree(board, max_depth, time_budget, deadline=None):
+    """Process pool task of a parallel hint: deepen the look-ahead from board until max_depth, or until
+    time_budget seconds after the task started (or the time.time() deadline, if given, when that is sooner).
+    Returns the score of every completed depth, the one-ply score first; a win counts for every depth"""
+    stop = time.time() + time_budget
+    if deadline is not None:
+        stop = min(stop, deadline)
+
+    context = SearchContext()
+    scores = [board.calculate_heuristic(False)]
+    while len(scores) <= max_depth:
+        if scores[-1] >= VICTORY_SCORE:
+            scores.append(VICTORY_SCORE)
+        elif time.time() < stop:
+            scores.append(board.improved_look_ahead_score_boost(context, len(scores)))
+        else:
+            break
+    return scores
+
+
+def best_at_common_depth(results):
+    """(key, score, depth) of the best of {key: search_subtree scores}, compared at the deepest depth that
+    every one of them reached: a look-ahead maximum is not comparable with a shallower score"""
+    depth = min(len(scores) for scores in results.values()) - 1
+    key = max(results, key=lambda k: results[k][depth])
+    return key, results[key][depth], depth
+
+
+def root_children(board):
+    """Distinct positions one move away from board: {transposition key: (board, move records, one-ply score)}"""
+    children = {}
+    board = board.clone()
+    for move in board.legal_moves():
+        played = board.apply_with_auto_play(move)
+        key = board.transposition_key()
+        if key not in children:
+            children[key] = (board.clone(), tuple(board.move_log), board.calculate_heuristic(False))
+        board.undo_all(played)
+    return children
+
+
+def record_to_move(record):
+    """Move descriptor that replays a move log record with apply()"""
+    kind, source, target, count, _ = record
+    if kind == MOVE_SUPERMOVE:
+        return kind, source, target, count
+    return kind, source, target
+
+
+def is_new_position(state, visited, context):
+    """Look-ahead filter: reject positions already seen by this look-ahead or already queued by the search"""
+    key = state.transposition_key()
+    if key in visited or key in context.closed:
+        context.dedupe["look_ahead"] += 1
+        return False
+    return True
+
+
+def look_ahead_score(board, context, max_depth=3, current_depth=0, visited=None, alpha=-float('inf'),
+                     beta=float('inf')):
+    """Depth-limited look-ahead with alpha-beta pruning, shared by both state classes: the best
+    calculate_heuristic(False) score within max_depth moves. Terminates early if a winning state is found."""
+    if visited is None:
+        visited = set()
+
+    key = board.transposition_key()
+    visited.add(key)
+    if context.stats is not None:
+        context.stats.look_ahead_nodes += 1
+
+    # Check for victory condition immediately
+    if board.is_winner():
+        return VICTORY_SCORE
+
+    # A position already searched at least this deep answers the request. Scores are stored without the
+    # move count penalty, which depends on the path that reached the position
+    remaining = max_depth - current_depth
+    penalty = board.move_count * board.current_weights.MOVE_COUNT_SCORE
+    if remaining > 0:
+        cached = context.look_ahead_table.get(key, remaining)
+        if cached is not None:
+            return cached if cached >= VICTORY_SCORE else cached - penalty
+
+    base_score = board.calculate_heuristic(False)
+
+    # Also terminate if score is already at victory level
+    if base_score >= VICTORY_SCORE:
+        return VICTORY_SCORE
+
+    # Stop recursion at max depth
+    if current_depth >= max_depth:
+        return base_score
+
+    best_score = base_score
+    next_moves = []
+
+    # Try every move in place and keep the new positions with their score; nothing is cloned
+    for move in board.legal_moves():
+        played = board.apply_with_auto_play(move)
+
+        # Early termination - if the move creates a winning state
+        if board.is_winner():
+            board.undo_all(played)
+            context.look_ahead_table.put(key, remaining, VICTORY_SCORE)
+            return VICTORY_SCORE
+
+        # Moves to the foundation from the tableau are always worth a look
+        if move[0] == MOVE_TO_FOUNDATION or is_new_position(board, visited, context):
+            next_moves.append((board.calculate_heuristic(False), move))
+
+        board.undo_all(played)
+
+    # Instead of evaluating all states, sort and only look at the most promising ones
+    next_moves.sort(key=lambda scored: scored[0], reverse=True)
+
+    for _, move in next_moves:
+        # Alpha-beta pruning
+        played = board.apply_with_auto_play(move)
+        score = board.improved_look_ahead_score_boost(context, max_depth, current_depth + 1, visited, alpha, beta)
+        board.undo_all(played)
+
+        # Early termination if a winning state was found in the branch
+        if score >= VICTORY_SCORE:
+            context.look_ahead_table.put(key, remaining, VICTORY_SCORE)
+            return VICTORY_SCORE
+
+        best_score = max(best_score, score)
+
+        alpha = max(alpha, best_score)
+        if beta <= alpha:
+            break  # Beta cutoff
+
+    context.look_ahead_table.put(key, remaining, best_score + penalty)
+    return best_score
+
+
+def heuristic_score(board, apply_bonus=True, context=None):
+    """calculate_heuristic of both state classes: the weighted sum of the board's scorers, replaced by a
+    look-ahead score while the search stagnates (apply_bonus)"""
+    if board.is_winner():
+        return VICTORY_SCORE
+
+    base_score = (
+            board.get_foundation_score() +
+            board.get_free_cell_score() +
+            board.get_tableau_empty_score() +
+            board.get_tableau_order_score() +
+            board.card_excavation_score() +
+            board.get_sequential_chains_score() +
+            board.get_balanced_foundation_score() +
+            board.get_potential_moves_score() -
+            board.get_blocked_cards_penalty() -
+            board.move_count * board.current_weights.MOVE_COUNT_SCORE
+    )
+
+    if not apply_bonus:
+        return base_score
+
+    if context is None:
+        context = SearchContext()
+
+    if context.is_stagnating(board.stagnation_threshold):
+        dep = 2
+        bonus = 0
+        while bonus < base_score + 5 - dep and dep < 5:
+            bonus = board.improved_look_ahead_score_boost(context, dep)
+            dep += 1
+        if context.stats is not None:
+            context.stats.record_look_ahead(dep - 1)
+        total_score = bonus
+    else:
+        total_score = base_score
+
+    context.record_score(total_score)
+
+    return total_score
+
+
+class TranspositionTable:
+    """LRU-bounded map from position key to (depth searched, score). A stored result answers any request of
+    equal or lower depth"""
+
+    def __init__(self, max_size=LOOK_AHEAD_TABLE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, depth):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, depth, score):
+        if self.max_size <= 0:
+            return
+
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > depth:
+            return  # keep the deeper result
+
+        self.entries[key] = (depth, score)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SearchContext:
+    """Everything one search owns: the closed set, the stagnation score window, counters and the phase
+    weight tables. Each FreecellBot run starts a fresh one, so searches never leak into each other"""
+
+    def __init__(self, phase_weights=None, phase_stagnation=None):
+        self.closed = set()  # transposition keys already queued
+        self.positions = None  # transposition key -> position_code() of the queued positions, when checked
+        self.key_collisions = 0  # positions skipped as duplicates although their position code differed
+        self.prev_scores = []  # last STAGNATION_WINDOW scores handed out with the bonus
+        self.dedupe = {"queue": 0, "look_ahead": 0}  # duplicates collapsed by each part of the search
+        self.expanded = 0
+        self.evaluations = 0  # full calculate_heuristic(True) calls made for queued nodes
+        self.requeued = 0  # lazily scored nodes pushed back because their real score was no longer the best
+        self.look_ahead_table = TranspositionTable()
+        self.stats = None  # a SearchStats when the bot collects them
+        self.phase_weights = phase_weights if phase_weights is not None else PHASE_WEIGHTS
+        self.phase_stagnation = phase_stagnation if phase_stagnation is not None else PHASE_STAGNATION
+
+    def bind(self, board):
+        """Make board, and every clone taken from it, use this context's weight tables"""
+        board.phase_weights = self.phase_weights
+        board.phase_stagnation = self.phase_stagnation
+        board.update_weights()
+
+    def is_stagnating(self, threshold):
+        """True once a full window of scores has moved less than threshold"""
+        if len(self.prev_scores) < STAGNATION_WINDOW:
+            return False
+        return max(self.prev_scores) - min(self.prev_scores) < threshold
+
+    def record_score(self, score):
+        self.prev_scores.append(score)
+        if len(self.prev_scores) > STAGNATION_WINDOW:
+            self.prev_scores.pop(0)
+
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
-THREAD_POOL_EXECUTOR = ThreadPoolExecutor(max_workers=8)
-prev_scores = []
+class SearchStats:
+    """Instrumentation of one greedy search, collected with FreecellBot(stats=True); the plain search only
+    pays for an `is not None` check where the counters would go.
+
+    Times are wall-clock seconds. heuristic covers the full calculate_heuristic(True) calls, look-ahead
+    included; move_generation is legal_moves() and hashing is transposition_key() for the queued children"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.generated = 0  # children produced by move generation, duplicates included
+        self.clones = 0
+        self.look_ahead_triggers = 0
+        self.look_ahead_depths = 0  # sum of the depths reached, for the mean
+        self.look_ahead_max_depth = 0
+        self.look_ahead_nodes = 0  # positions visited inside look-aheads
+        self.frontier_samples = []  # (nodes expanded, frontier size) every STATS_FRONTIER_INTERVAL expansions
+        self.timers = {"move_generation": 0.0, "hashing": 0.0, "heuristic": 0.0}
+
+    def add_time(self, timer, started):
+        self.timers[timer] += time.perf_counter() - started
+
+    def record_look_ahead(self, depth):
+        self.look_ahead_triggers += 1
+        self.look_ahead_depths += depth
+        self.look_ahead_max_depth = max(self.look_ahead_max_depth, depth)
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def summary(self, context, queue):
+        """JSON-ready dict of these stats and the counters the context and queue always keep"""
+        table = context.look_ahead_table
+        triggers = self.look_ahead_triggers
+        return {
+            "elapsed": round(self.elapsed, 4),
+            "expanded": context.expanded,
+            "generated": self.generated,
+            "duplicates": dict(context.dedupe),
+            "clones": self.clones,
+            "heuristic_calls": context.evaluations,
+            "requeued": context.requeued,
+            "look_ahead": {
+                "triggers": triggers,
+                "mean_depth": round(self.look_ahead_depths / triggers, 2) if triggers else 0,
+                "max_depth": self.look_ahead_max_depth,
+                "nodes": self.look_ahead_nodes,
+                "table_hit_rate": round(table.hit_rate(), 4),
+            },
+            "frontier": {
+                "peak": queue.peak_size,
+                "evicted": queue.evicted,
+                "samples": self.frontier_samples,
+            },
+            "timers": {timer: round(seconds, 4) for timer, seconds in self.timers.items()},
+        }
+
+
+class SolveResult:
+    """Outcome of FreecellBot.solve: the solution, or the best partial line when the budget ran out.
+
+    reason is "solved", "deadline", "node_budget" or "exhausted" (the search ran out of positions).
+    moves are move log records from the start board; board is the position they lead to"""
+
+    def __init__(self, reason, moves, board, score, nodes, elapsed):
+        self.reason = reason
+        self.solved = reason == "solved"
+        self.moves = moves
+        self.board = board
+        self.foundation_cards = 52 - board.cards_left()
+        self.score = score
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    def to_dict(self):
+        return {
+            "solved": self.solved,
+            "reason": self.reason,
+            "moves": [describe_move(record) for record in self.moves],
+            "foundation_cards": self.foundation_cards,
+            "score": self.score,
+            "nodes": self.nodes,
+            "elapsed": round(self.elapsed, 4),
+        }
+
+
+def can_stack(card, target):
+    """Check if card can be placed on top of target in the tableau"""
+    return CAN_STACK[card.id][target.id]
+
+
+def get_pile_stats(pile):
+    """(whole pile is one sequence, longest sequence run, sequence run on top) of a tableau pile"""
+    if not pile:
+        return True, 1, 0
+
+    in_sequence = True
+    current_chain = 1
+    longest_chain = 1
+    for i in range(1, len(pile)):
+        if CAN_STACK[pile[i].id][pile[i - 1].id]:
+            current_chain += 1
+            longest_chain = max(longest_chain, current_chain)
+        else:
+            in_sequence = False
+            current_chain = 1
+    return in_sequence, longest_chain, current_chain
 
-previousSet = set()
 
 # Cards
 class Card:
@@ -26,6 +477,7 @@ class Card:
         self.suit = suit
         self.value = CARD_VALUES[rank]
         self.color = Fore.RED if suit in ['Hearts', 'Diamonds'] else Fore.BLACK
+        self.id = TYPES.index(suit) * 13 + self.value - 1  # 0..51, used for hashing and lookup tables
 
     def __repr__(self):
         return f'{self.color}{self.rank} of {self.suit}{Style.RESET_ALL}'
@@ -42,17 +494,30 @@ class Card:
         return self
 
 class BoardState:
-    def __init__(self, tableau, free_cells, foundations, initialize_deck=True):
+    def __init__(self, tableau, free_cells, foundations, initialize_deck=True, key=None):
         self.move_count = 0
         self.tableau = tableau
         self.free_cells = free_cells
         self.foundations = foundations
         self.starting_point = False
         self.history = []
-        self.current_weights = SimpleNamespace(**DEFAULT_WEIGHTS)
+        self.phase_weights = PHASE_WEIGHTS
+        self.phase_stagnation = PHASE_STAGNATION
+        self.current_weights = PHASE_WEIGHTS["early"]
         self.stagnation_threshold = STAGNATION_THRESHOLD_EARLY
 
-        self.move_string = ""
+        # Per-pile heuristic inputs, recomputed lazily for the piles flagged in the dirty bitmask
+        self.pile_stats = [(True, 1, 0)] * TABLEAU_COUNT
+        self.tops = [None] * TABLEAU_COUNT
+        self.stacking_pairs = 0  # ordered pairs of pile tops where the first can go on the second
+        self.dirty = ALL_PILES
+
+        # Card id -> (pile, depth) for tableau cards, (FREECELL_PILE, cell) for free cells, None once on a foundation
+        self.locations = [None] * 52
+
+        # Moves played on this object since it was created or cloned, as (kind, source, target, count, card);
+        # the search stores each step on its BotMove and rebuilds the solution text only once
+        self.move_log = []
 
         if initialize_deck:  # Only initialize deck for new games, not clones
             self.deck = [Card(rank, suit) for suit in TYPES for rank in RANKS]
@@ -63,6 +528,184 @@ class BoardState:
             self.deck_size = 0
 
         self.update_weights()
+        if key is not None:
+            self.key = key
+        else:
+            self.rehash()
+
+    @classmethod
+    def from_deal(cls, deal_number):
+        """Starting board of a Microsoft FreeCell numbered deal"""
+        tableau = [[Card(rank, suit) for rank, suit in column] for column in deal_columns(deal_number)]
+        return cls(tableau, [None] * FREECELL_COUNT, {suit: [] for suit in TYPES}, initialize_deck=False)
+
+    def compute_key(self, symmetric=False, suits=SUIT_SWAPS[0]):
+        """Full Zobrist key of the position; the move methods keep self.key updated incrementally.
+
+        The symmetric key does not depend on which column or cell holds what (see symmetric_key).
+        suits permutes the suits before hashing."""
+        if symmetric:
+            return symmetric_key(*self.symmetric_key_parts(suits))
+
+        key = 0
+        for i, pile in enumerate(self.tableau):
+            for depth, card in enumerate(pile):
+                key ^= ZOBRIST_TABLEAU[i][depth][suits[card.id // 13] * 13 + card.id % 13]
+        for i, card in enumerate(self.free_cells):
+            if card:
+                key ^= ZOBRIST_FREECELL[i][suits[card.id // 13] * 13 + card.id % 13]
+        for s, suit in enumerate(TYPES):
+            key ^= ZOBRIST_FOUNDATION[suits[s]][len(self.foundations[suit])]
+        return key
+
+    def symmetric_key_parts(self, suits=SUIT_SWAPS[0]):
+        """(key of every column, key of the free cells and foundations) that make up the symmetric key.
+        A column key hashes its cards by depth with a table shared by all columns"""
+        pile_keys = []
+        for pile in self.tableau:
+            key = 0
+            for depth, card in enumerate(pile):
+                key ^= ZOBRIST_TABLEAU[0][depth][suits[card.id // 13] * 13 + card.id % 13]
+            pile_keys.append(key)
+
+        cell_key = 0
+        for card in self.free_cells:
+            if card:
+                cell_key ^= ZOBRIST_FREECELL[0][suits[card.id // 13] * 13 + card.id % 13]
+        for s, suit in enumerate(TYPES):
+            cell_key ^= ZOBRIST_FOUNDATION[suits[s]][len(self.foundations[suit])]
+        return pile_keys, cell_key
+
+    def rehash(self):
+        """Recompute the keys and cached values after the piles were edited directly"""
+        self.key = self.compute_key()
+        self.pile_keys, self.cell_key = self.symmetric_key_parts()
+        self.sym_key = None
+        self.dirty = ALL_PILES
+        self.update_weights()
+
+        self.locations = [None] * 52
+        for i, pile in enumerate(self.tableau):
+            for depth, card in enumerate(pile):
+                self.locations[card.id] = (i, depth)
+        for i, card in enumerate(self.free_cells):
+            if card:
+                self.locations[card.id] = (FREECELL_PILE, i)
+
+    def next_foundation_card(self, suit_idx):
+        """(card id, location) of the next card the foundation of a suit needs, None if it is complete"""
+        level = len(self.foundations[TYPES[suit_idx]])
+        if level >= 13:
+            return None
+        card_id = suit_idx * 13 + level
+        return card_id, self.locations[card_id]
+
+    def is_safe_foundation_move(self, card):
+        """A foundation move that can never hurt: aces and twos, or cards whose opposite-colour
+        lower ranks are all home already, so no tableau card could still need it as a base"""
+        if card.value <= 2:
+            return True
+
+        opposite = ('Hearts', 'Diamonds') if card.id < 26 else ('Spades', 'Clubs')
+        return all(len(self.foundations[suit]) >= card.value - 1 for suit in opposite)
+
+    def auto_play(self):
+        """Play safe foundation moves until none is left and return the moves played"""
+        played = []
+
+        progress = True
+        while progress:
+            progress = False
+            for move in self.foundation_moves():
+                if move[0] == MOVE_TO_FOUNDATION:
+                    card = self.tableau[move[1]][-1]
+                else:
+                    card = self.free_cells[move[1]]
+
+                if self.is_safe_foundation_move(card):
+                    self.apply(move)
+                    played.append(move)
+                    progress = True
+
+        return played
+
+    def apply_with_auto_play(self, move):
+        """Apply a move followed by the safe foundation moves it unlocks; returns everything played"""
+        self.apply(move)
+        if AUTO_PLAY_SAFE_MOVES:
+            return [move] + self.auto_play()
+        return [move]
+
+    def undo_all(self, moves):
+        """Undo a list of moves returned by apply_with_auto_play"""
+        for move in reversed(moves):
+            self.undo(move)
+
+    def foundation_moves(self):
+        """Foundation moves available right now, read from the location index instead of scanning the piles"""
+        moves = []
+        for s in range(len(TYPES)):
+            needed = self.next_foundation_card(s)
+            if needed is None or needed[1] is None:
+                continue
+
+            pile, depth = needed[1]
+            if pile == FREECELL_PILE:
+                moves.append((MOVE_FREECELL_TO_FOUNDATION, depth, s))
+            elif depth == len(self.tableau[pile]) - 1:
+                moves.append((MOVE_TO_FOUNDATION, pile, s))
+        return moves
+
+    def refresh_pile_cache(self):
+        """Bring the cached stats of the piles changed since the last evaluation up to date"""
+        if not self.dirty:
+            return
+
+        for i in range(TABLEAU_COUNT):
+            if not self.dirty & (1 << i):
+                continue
+
+            pile = self.tableau[i]
+            top = pile[-1] if pile else None
+            if top is not self.tops[i]:
+                self.stacking_pairs += self.count_stacking_pairs(i, top) - self.count_stacking_pairs(i, self.tops[i])
+                self.tops[i] = top
+            self.pile_stats[i] = get_pile_stats(pile)
+
+        self.dirty = 0
+
+    def count_stacking_pairs(self, tableau_idx, top):
+        """Pairs between top (as the top card of tableau_idx) and the other cached pile tops"""
+        if top is None:
+            return 0
+
+        count = 0
+        for j, other in enumerate(self.tops):
+            if j == tableau_idx or other is None:
+                continue
+            count += CAN_STACK[top.id][other.id] + CAN_STACK[other.id][top.id]
+        return count
+
+    def canonical_key(self, suit_swap=False):
+        """Key shared by every position equal to this one up to column order, free cell order
+        and (optionally) swapping the two black or the two red suits"""
+        if not suit_swap:
+            if self.sym_key is None:  # the moves only update its parts; summing the columns waits until needed
+                self.sym_key = symmetric_key(self.pile_keys, self.cell_key)
+            return self.sym_key
+        return min(self.compute_key(True, suits) for suits in SUIT_SWAPS)
+
+    def position_code(self):
+        """The position as bytes, up to column and free cell order; the foundations hold every card that is not
+        in the tableau or a free cell. Longer than a key, but two positions never share it"""
+        columns = sorted(bytes(card.id for card in pile) for pile in self.tableau)
+        return b"\xff".join(columns) + b"\xfe" + bytes(sorted(card.id for card in self.free_cells if card))
+
+    def transposition_key(self):
+        """Key used for duplicate detection in the searches"""
+        if CANONICAL_DEDUPE:
+            return self.canonical_key(SUIT_SWAP_DEDUPE)
+        return self.key
     
     def get_game_phase(board):
         foundation_progress = sum(len(foundation) for foundation in board.foundations.values()) / 52
@@ -75,57 +718,32 @@ class BoardState:
             return "late"
         
     def update_weights(self):
+        """Switch to the shared weights of the current phase; only foundation moves can change it"""
         phase = self.get_game_phase()
-        # Merge default weights with phase-specific overrides
-
-        match phase:
-            case 'early':
-                self.stagnation_threshold = STAGNATION_THRESHOLD_EARLY
-
-            case 'mid':
-                self.stagnation_threshold = STAGNATION_THRESHOLD_MID
-
-            case 'late':
-                self.stagnation_threshold = STAGNATION_THRESHOLD_LATE
-
-        weights = {**DEFAULT_WEIGHTS, **WEIGHT_PROFILES.get(phase, {})}
-        self.current_weights = SimpleNamespace(**weights)
+        self.stagnation_threshold = self.phase_stagnation[phase]
+        self.current_weights = self.phase_weights[phase]
 
     def __eq__(self, other):
 
-        # print("EQ STARTED")
-
         if not isinstance(other, BoardState):
             return False
 
-        # Compare corresponding cards in tableau
-        for i in self.tableau:
-            if i not in other.tableau: return False
+        # Different keys can never be equal positions, so most comparisons stop here
+        if self.key != other.key:
+            return False
 
-        # Check free cells equality
-        for i in self.free_cells:
-            if i not in other.free_cells: return False
+        # Same key: confirm with a full comparison to rule out a collision
+        if self.tableau != other.tableau or self.free_cells != other.free_cells:
+            return False
 
-        # Check foundations equality: Compare both length and the actual cards in the foundation
         for suit in TYPES:
-
-            # print("foundations", self.foundations[suit], other.foundations[suit])
-
             if len(self.foundations[suit]) != len(other.foundations[suit]):
                 return False
 
-            if self.foundations[suit] != other.foundations[suit]:  # Compare the actual cards in the foundation piles
-                return False
-
-        # print("returning true")
         return True
 
     def __hash__(self):
-        tableau_hash = hash(tuple(tuple(pile) for pile in self.tableau))
-        free_cells_hash = hash(tuple(self.free_cells))
-        foundations_hash = hash(tuple((k, tuple(v)) for k, v in self.foundations.items()))
-
-        return hash((tableau_hash, free_cells_hash, foundations_hash))
+        return self.key
 
     def set_starting_point(self):
         self.starting_point = True
@@ -141,12 +759,14 @@ class BoardState:
         if not hasattr(self, 'deck') or self.deck is None:
             return
 
-        d = deepcopy(self.deck)
+        d = list(self.deck)  # cards are immutable, only the list is consumed
 
         for i in range(len(d)):
             pos = i % TABLEAU_COUNT
             self.tableau[pos].append(d.pop())
 
+        self.rehash()
+
     def get_foundation_score(self):
         """Heuristic score based on how many cards are in the foundations."""
         score = 0
@@ -161,18 +781,11 @@ class BoardState:
     #TODO: maybe give some score, even if only part of the pile is organized
     def get_tableau_order_score(self):
         """Heuristic score based on how well tableau piles are organized."""
+        self.refresh_pile_cache()
         score = 0
-        for pile in self.tableau:
-            if pile:
-                valid_sequence = True
-                for i in range(1, len(pile)):
-                    prev_card = pile[i - 1]
-                    curr_card = pile[i]
-                    if not (curr_card.value == prev_card.value - 1 and curr_card.color != prev_card.color):
-                        valid_sequence = False
-                        break
-                if valid_sequence:
-                    score += len(pile) * self.current_weights.ORDER_MULTIPLIER
+        for pile, (in_sequence, _, _) in zip(self.tableau, self.pile_stats):
+            if pile and in_sequence:
+                score += len(pile) * self.current_weights.ORDER_MULTIPLIER
         return score
 
 
@@ -214,38 +827,18 @@ class BoardState:
 
         score = 0
 
-        for extra,suit in enumerate(TYPES):
-
-            if not self.foundations[suit]:
-                next_card_val = 1
-            else:
-                card = self.foundations[suit][-1]
-
-                if card.value >= 13: continue
-                next_card_val = card.value + 1
-
-
-            check = False
-            for i in range(TABLEAU_COUNT):
-                for index,card in enumerate(self.tableau[i]):
-
-                    if card.value != next_card_val: continue
-                    if card.suit != suit: continue
-                    check = True
+        for extra in range(len(TYPES)):
 
-                    pos = (len(self.tableau[i]) - index)
+            needed = self.next_foundation_card(extra)
+            if needed is None or needed[1][0] == FREECELL_PILE: continue
 
-                    score += extra * 2 #The algorithm favours some suits over anothers
-                    #This is meant to break stalemates so if there are 2 different cards on the same depth, one will be prefered by the algorithm over another
+            pile, depth = needed[1]
+            pos = (len(self.tableau[pile]) - depth)
 
-                    if pos == 0:
-                        score += self.current_weights.CARD_EXCAVATION_MULTIPLIER * 2
-                    else:
-                        score += self.current_weights.CARD_EXCAVATION_MULTIPLIER/pos
-                    break
-
-                if check: break
+            score += extra * 2 #The algorithm favours some suits over anothers
+            #This is meant to break stalemates so if there are 2 different cards on the same depth, one will be prefered by the algorithm over another
 
+            score += self.current_weights.CARD_EXCAVATION_MULTIPLIER/pos
 
         return score
 
@@ -253,32 +846,13 @@ class BoardState:
 
         dist = 100000
 
-        for suit in TYPES:
-
-            if not self.foundations[suit]:
-                next_card_val = 1
-            else:
-                card = self.foundations[suit][-1]
-
-                if card.value >= 13: continue
-                next_card_val = card.value + 1
-
-            check = False
-            for i in range(TABLEAU_COUNT):
-                for index, card in enumerate(self.tableau[i]):
-
-                    if card.value != next_card_val: continue
-                    if card.suit != suit: continue
+        for s in range(len(TYPES)):
 
-                    from_top = len(self.tableau[i]) - index
+            needed = self.next_foundation_card(s)
+            if needed is None or needed[1][0] == FREECELL_PILE: continue
 
-                    if dist > from_top:
-                        dist = from_top
-                        if dist == 0 : return 100
-
-                    break
-
-                if check: break
+            pile, depth = needed[1]
+            dist = min(dist, len(self.tableau[pile]) - depth)
 
         return 80 / dist
 
@@ -294,24 +868,12 @@ class BoardState:
 
     def get_sequential_chains_score(self):
         """Reward long sequential chains that are correctly ordered and can be moved together."""
+        self.refresh_pile_cache()
         score = 0
-        for pile in self.tableau:
+        for pile, (_, longest_chain, _) in zip(self.tableau, self.pile_stats):
             if len(pile) <= 1:
                 continue
 
-            # Find continuous chains
-            current_chain = 1
-            longest_chain = 1
-            for i in range(1, len(pile)):
-                prev_card = pile[i - 1]
-                curr_card = pile[i]
-
-                if curr_card.value == prev_card.value - 1 and curr_card.color != prev_card.color:
-                    current_chain += 1
-                    longest_chain = max(longest_chain, current_chain)
-                else:
-                    current_chain = 1
-
             # Reward exponentially for longer chains
             chain_score = longest_chain ** 1.5 * self.current_weights.CHAIN_MULTIPLIER
 
@@ -328,34 +890,27 @@ class BoardState:
         """Penalize situations where lower cards are blocked by higher cards of same color."""
         penalty = 0
 
-        # Track which cards we need for immediate foundation building
-        needed_cards = {}
-        for suit in TYPES:
-            if not self.foundations[suit]:
-                needed_value = 1  # Ace
-            else:
-                top_card = self.foundations[suit][-1]
-                needed_value = top_card.value + 1
+        # Look up the cards we need for immediate foundation building
+        for s in range(len(TYPES)):
+            needed = self.next_foundation_card(s)
+            if needed is None or needed[1][0] == FREECELL_PILE:
+                continue
 
-            if needed_value <= 13:  # Only if not complete
-                needed_cards[suit] = needed_value
+            card_id, (pile_idx, i) = needed
+            pile = self.tableau[pile_idx]
 
-        # Check for blocked cards
-        for pile in self.tableau:
-            for i, card in enumerate(pile):
-                # Check if this is a needed card
-                if card.suit in needed_cards and card.value == needed_cards[card.suit]:
-                    # Count how many cards are above it
-                    cards_above = len(pile) - i - 1
+            # Count how many cards are above it
+            cards_above = len(pile) - i - 1
 
-                    # Higher penalty if blocked by many cards
-                    if cards_above > 0:
-                        penalty += cards_above * self.current_weights.BLOCKED_CARD_PENALTY
+            # Higher penalty if blocked by many cards
+            if cards_above > 0:
+                penalty += cards_above * self.current_weights.BLOCKED_CARD_PENALTY
 
-                        # Extra penalty if blocked by cards of same color (which can't help uncover it)
-                        for j in range(i + 1, len(pile)):
-                            if pile[j].color == card.color:
-                                penalty += self.current_weights.SAME_COLOR_BLOCK_PENALTY
+                # Extra penalty if blocked by cards of same color (which can't help uncover it)
+                red = CARD_IS_RED[card_id]
+                for j in range(i + 1, len(pile)):
+                    if CARD_IS_RED[pile[j].id] == red:
+                        penalty += self.current_weights.SAME_COLOR_BLOCK_PENALTY
 
         return penalty
 
@@ -376,192 +931,27 @@ class BoardState:
 
     def can_go_to_foundation(self, card):
         """Check if a card can be moved to the foundation immediately."""
-        if card.rank == 'A' and not self.foundations[card.suit]:
-            return True
-
-        if self.foundations[card.suit]:
-            top_card = self.foundations[card.suit][-1]
-            return card.value == top_card.value + 1
-
-        return False
+        return len(self.foundations[card.suit]) == card.value - 1
 
     def get_potential_moves_score(self):
         """Evaluate the number of potential moves available."""
-        potential_moves = 0
+        self.refresh_pile_cache()
 
-        # Check for movable cards between tableau piles
-        for i in range(TABLEAU_COUNT):
-            if not self.tableau[i]:
-                continue
-
-            bottom_card = self.tableau[i][-1]
-
-            # Check if it can move to an empty tableau
-            if any(len(pile) == 0 for pile in self.tableau):
-                potential_moves += 1
-
-            # Check if it can move to another tableau pile
-            for j in range(TABLEAU_COUNT):
-                if i == j or not self.tableau[j]:
-                    continue
-
-                target_card = self.tableau[j][-1]
-                if bottom_card.value == target_card.value - 1 and bottom_card.color != target_card.color:
-                    potential_moves += 1
+        # Every top card can move to an empty tableau, plus the cached top-on-top pairs
+        empty_piles = self.tops.count(None)
+        potential_moves = self.stacking_pairs
+        if empty_piles:
+            potential_moves += TABLEAU_COUNT - empty_piles
 
         # Value of having potential moves
         return potential_moves * self.current_weights.POTENTIAL_MOVE_MULTIPLIER
 
-    def improved_look_ahead_score_boost(self, max_depth=3, current_depth=0, visited=None, alpha=-float('inf'),
+    def improved_look_ahead_score_boost(self, context, max_depth=3, current_depth=0, visited=None, alpha=-float('inf'),
                                         beta=float('inf')):
-        """Enhanced look-ahead with alpha-beta pruning for better performance.
-        Now terminates early if a winning state is found."""
-        if visited is None:
-            visited = set()
-
-        # Create a hashable representation of the current state
-
-        visited.add(self)
-
-        # Check for victory condition immediately
-        if self.is_winner():
-            return VICTORY_SCORE
-
-        base_score = self.calculate_heuristic(False)
-
-        # Also terminate if score is already at victory level
-        if base_score >= VICTORY_SCORE:
-            return VICTORY_SCORE
-
-        # Stop recursion at max depth
-        if current_depth >= max_depth:
-            return base_score
-
-        best_score = base_score
-        next_states = []
-
-        # Generate all possible moves (same as original)
-        for i in range(TABLEAU_COUNT):
-            new_state = self.clone()
-            if new_state.move_to_freecell(i) and new_state not in visited and new_state not in previousSet:
-                next_states.append(new_state)
-
-            new_state = self.clone()
-            if new_state.move_to_foundation(i):
-                next_states.append(new_state)
-                # Early termination - if moving to foundation creates a winning state
-                if new_state.is_winner():
-                    return VICTORY_SCORE
-
-            for j in range(FREECELL_COUNT):
-                new_state = self.clone()
-                if new_state.move_to_tableau(j, i) and new_state not in visited and new_state not in previousSet:
-                    next_states.append(new_state)
-
-            for j in range(TABLEAU_COUNT):
-                if i == j: continue
-
-                new_state = self.clone()
-                if new_state.move_tableau_to_tableau(i, j) and new_state not in visited and new_state not in previousSet:
-                    next_states.append(new_state)
+        return look_ahead_score(self, context, max_depth, current_depth, visited, alpha, beta)
 
-        for j in range(FREECELL_COUNT):
-            new_state = self.clone()
-            if new_state.move_freecell_to_foundation(j) and new_state not in visited and new_state not in previousSet:
-                next_states.append(new_state)
-                # Early termination - if moving to foundation creates a winning state
-                if new_state.is_winner():
-                    return VICTORY_SCORE
-
-        # Instead of evaluating all states, sort and only look at the most promising ones
-        next_states.sort(key=lambda s: s.calculate_heuristic(False), reverse=True)
-
-        # Only consider the top N states to improve search efficiency
-        top_n = len(next_states) #min(8, len(next_states))
-
-        for next_state in next_states[:top_n]:
-            # Alpha-beta pruning
-            score = next_state.improved_look_ahead_score_boost(max_depth, current_depth + 1, visited, alpha, beta)
-
-            # Early termination if a winning state was found in the branch
-            if score >= VICTORY_SCORE:
-                return VICTORY_SCORE
-
-            best_score = max(best_score, score)
-
-            alpha = max(alpha, best_score)
-            if beta <= alpha:
-                break  # Beta cutoff
-
-        return best_score
-
-    # Now modify the calculate_heuristic method to include these new evaluations
-    def calculate_heuristic(self, apply_bonus=True):
-
-        self.update_weights()
-
-        # Original scores
-        foundation_score = self.get_foundation_score()
-        free_cell_score = self.get_free_cell_score()
-        empty_tableau_score = self.get_tableau_empty_score()
-        tableau_order_score = self.get_tableau_order_score()
-        card_excavation_score = self.card_excavation_score()
-
-        phase = self.get_game_phase()
-        weights = self.current_weights
-
-        # New scores
-        sequential_chains_score = self.get_sequential_chains_score()
-        blocked_cards_penalty = self.get_blocked_cards_penalty()
-        balanced_foundation_score = self.get_balanced_foundation_score()
-        potential_moves_score = self.get_potential_moves_score()
-
-        move_penalty = self.move_count * weights.MOVE_COUNT_SCORE
-
-        if self.is_winner():
-            return VICTORY_SCORE
-
-        base_score = (
-                foundation_score +
-                free_cell_score +
-                empty_tableau_score +
-                tableau_order_score +
-                card_excavation_score +
-                sequential_chains_score +
-                balanced_foundation_score +
-                potential_moves_score -
-                blocked_cards_penalty -
-                move_penalty
-        )
-
-        if apply_bonus:
-            if len(prev_scores) == 10:
-                stagnation = (max(prev_scores) - min(prev_scores)) < self.stagnation_threshold
-            else: 
-                stagnation = False
-
-            if stagnation:
-                #print("Calling dfs!")
-                dep = 2
-                bonus = 0
-                while bonus < base_score + 5 - dep and dep < 5:
-                    bonus = self.improved_look_ahead_score_boost(dep)
-                    dep += 1
-
-                #print("Depth needed:", dep)
-                total_score = bonus
-            else:
-                total_score = base_score
-
-            prev_scores.append(total_score)
-
-            if len(prev_scores) > 10:
-                prev_scores.pop(0)
-        else:
-            total_score = base_score
-        
-        # Append the actual score used for this state
-        return total_score
+    def calculate_heuristic(self, apply_bonus=True, context=None):
+        return heuristic_score(self, apply_bonus, context)
 
     def move_to_freecell(self, tableau_idx):
         if self.tableau[tableau_idx]:
@@ -569,8 +959,12 @@ class BoardState:
                 if not self.free_cells[i]:
                     card = self.tableau[tableau_idx].pop()
                     self.free_cells[i] = card
+                    self.toggle_tableau_key(tableau_idx, len(self.tableau[tableau_idx]), card)
+                    self.toggle_freecell_key(i, card)
+                    self.dirty |= 1 << tableau_idx
+                    self.locations[card.id] = (FREECELL_PILE, i)
                     #print(f"Moved {card} to free cell {i + 1}")
-                    self.move_string += f"\nMoved {card} to free cell {i + 1}"
+                    self.move_log.append((MOVE_TO_FREECELL, tableau_idx, i, 1, card))
                     self.move_count += 1
                     return True
 
@@ -580,10 +974,14 @@ class BoardState:
     def move_to_tableau(self, freecell_idx, tableau_idx):
         card = self.free_cells[freecell_idx]
         if card and self.is_valid_tableau_move(tableau_idx, card):
+            self.toggle_tableau_key(tableau_idx, len(self.tableau[tableau_idx]), card)
+            self.toggle_freecell_key(freecell_idx, card)
             self.tableau[tableau_idx].append(card)
             self.free_cells[freecell_idx] = None
+            self.dirty |= 1 << tableau_idx
+            self.locations[card.id] = (tableau_idx, len(self.tableau[tableau_idx]) - 1)
             #print(f"Moved {card} to tableau {tableau_idx + 1}")
-            self.move_string += f"\nMoved {card} to tableau {tableau_idx + 1}"
+            self.move_log.append((MOVE_TO_TABLEAU, freecell_idx, tableau_idx, 1, card))
             self.move_count += 1
             return True
         #print("Invalid move!")
@@ -596,20 +994,21 @@ class BoardState:
             if self.is_valid_tableau_move(to_idx, card):
 
                 self.tableau[to_idx].append(self.tableau[from_idx].pop())
+                self.toggle_tableau_key(from_idx, len(self.tableau[from_idx]), card)
+                self.toggle_tableau_key(to_idx, len(self.tableau[to_idx]) - 1, card)
+                self.dirty |= (1 << from_idx) | (1 << to_idx)
+                self.locations[card.id] = (to_idx, len(self.tableau[to_idx]) - 1)
 
                 #print(f"Moved {card} from tableau {from_idx + 1} to {to_idx + 1}")
-                self.move_string += f"\nMoved {card} from tableau {from_idx + 1} to {to_idx + 1}"
+                self.move_log.append((MOVE_TABLEAU_TO_TABLEAU, from_idx, to_idx, 1, card))
                 self.move_count += 1
                 return True
         #print("Invalid move!")
         return False
 
     def is_valid_tableau_move(self, tableau_idx, card):
-        if not self.tableau[tableau_idx]:
-            return True
-
-        top_card = self.tableau[tableau_idx][-1]
-        return (card.value == top_card.value - 1) and (card.color != top_card.color)
+        pile = self.tableau[tableau_idx]
+        return not pile or CAN_STACK[card.id][pile[-1].id]
 
     def move_to_foundation(self, tableau_idx):
         if self.tableau[tableau_idx]:
@@ -617,8 +1016,13 @@ class BoardState:
             if self.is_valid_foundation_move(card):
                 self.foundations[card.suit].append(card)
                 self.tableau[tableau_idx].pop()
+                self.toggle_tableau_key(tableau_idx, len(self.tableau[tableau_idx]), card)
+                self.toggle_foundation_key(card)
+                self.dirty |= 1 << tableau_idx
+                self.update_weights()
+                self.locations[card.id] = None
                 #print(f"Moved {card} to foundation {card.suit}")
-                self.move_string += f"\nMoved {card} to foundation {card.suit}"
+                self.move_log.append((MOVE_TO_FOUNDATION, tableau_idx, card.id // 13, 1, card))
                 self.move_count += 1
                 return True
         #print("Invalid move!")
@@ -629,31 +1033,65 @@ class BoardState:
         if card and self.is_valid_foundation_move(card):
             self.foundations[card.suit].append(card)
             self.free_cells[freecell_idx] = None
+            self.toggle_freecell_key(freecell_idx, card)
+            self.toggle_foundation_key(card)
+            self.update_weights()
+            self.locations[card.id] = None
             #print(f"Moved {card} to foundation {card.suit}")
-            self.move_string += f"\nMoved {card} to foundation {card.suit}"
+            self.move_log.append((MOVE_FREECELL_TO_FOUNDATION, freecell_idx, card.id // 13, 1, card))
             self.move_count += 1
             return True
         #print("Invalid move!")
         return False
 
+    def toggle_tableau_key(self, tableau_idx, depth, card):
+        """Add or remove card at depth of a tableau pile in both keys"""
+        self.key ^= ZOBRIST_TABLEAU[tableau_idx][depth][card.id]
+        self.pile_keys[tableau_idx] ^= ZOBRIST_TABLEAU[0][depth][card.id]
+        self.sym_key = None
+
+    def toggle_freecell_key(self, freecell_idx, card):
+        """Add or remove card in a free cell in both keys"""
+        self.key ^= ZOBRIST_FREECELL[freecell_idx][card.id]
+        self.cell_key ^= ZOBRIST_FREECELL[0][card.id]
+        self.sym_key = None
+
+    def toggle_foundation_key(self, card):
+        """Switch both keys between card's foundation with and without card on top"""
+        level = len(self.foundations[card.suit])
+        foundation_keys = ZOBRIST_FOUNDATION[card.id // 13]
+        delta = foundation_keys[level - 1] ^ foundation_keys[level]
+        self.key ^= delta
+        self.cell_key ^= delta
+        self.sym_key = None
+
     def is_valid_foundation_move(self, card):
-        if not self.foundations[card.suit]:
-            return card.rank == 'A'
-        top_card = self.foundations[card.suit][-1]
-        return card.value == top_card.value + 1
+        # Foundations only ever hold A..n of their suit, so the height says which card comes next
+        return len(self.foundations[card.suit]) == card.value - 1
 
     def get_empty_cells_and_cascades(self):
         empty_cells = self.free_cells.count(None)
         empty_cascades = sum(1 for pile in self.tableau if not pile)
         return empty_cells, empty_cascades
 
+    def max_supermove(self, to_empty_column=False):
+        """Most cards one sequence move can carry: (free cells + 1) * 2 ** empty columns,
+        not counting the target column when it is empty itself"""
+        empty_cells, empty_cascades = self.get_empty_cells_and_cascades()
+        if to_empty_column:
+            empty_cascades -= 1
+        return (empty_cells + 1) * (2 ** empty_cascades)
+
     def move_supermove(self, source_tableau_idx, target_tableau_idx, no_cards):
-        cards_to_move = self.tableau[source_tableau_idx][-no_cards:]
+        source = self.tableau[source_tableau_idx]
+        target = self.tableau[target_tableau_idx]
 
-        empty_cells, empty_cascades = self.get_empty_cells_and_cascades()
-        max_moveable = (empty_cells + 1) * (2 ** empty_cascades)
+        if source_tableau_idx == target_tableau_idx or not 0 < no_cards <= len(source):
+            return False
+
+        cards_to_move = source[-no_cards:]
 
-        if len(cards_to_move) > max_moveable:
+        if len(cards_to_move) > self.max_supermove(not target):
             #print(f"Cannot move {len(cards_to_move)} cards. More empty cells or cascades needed.")
             return False
 
@@ -661,19 +1099,22 @@ class BoardState:
             #print("The selected cards do not form a valid sequence!")
             return False
 
-        if self.tableau[target_tableau_idx]:
-            top_card = self.tableau[target_tableau_idx][-1]
-            leftmost_card = cards_to_move[0]
-            if not (leftmost_card.value == top_card.value - 1 and leftmost_card.color != top_card.color):
-                #print(f"Invalid move: {leftmost_card} cannot be placed on {top_card}!")
-                return False
+        if not self.is_valid_tableau_move(target_tableau_idx, cards_to_move[0]):
+            #print(f"Invalid move: {cards_to_move[0]} cannot be placed on {target[-1]}!")
+            return False
 
-        self.tableau[target_tableau_idx].extend(cards_to_move)
+        base = len(source) - no_cards
+        for offset, card in enumerate(cards_to_move):
+            self.toggle_tableau_key(source_tableau_idx, base + offset, card)
+            self.toggle_tableau_key(target_tableau_idx, len(target) + offset, card)
+            self.locations[card.id] = (target_tableau_idx, len(target) + offset)
 
-        for _ in range(no_cards):
-            self.tableau[target_tableau_idx].append(self.tableau[source_tableau_idx].pop())
+        del source[base:]
+        target.extend(cards_to_move)
+        self.dirty |= (1 << source_tableau_idx) | (1 << target_tableau_idx)
 
         #print(f"Moved {len(cards_to_move)} cards from tableau {source_tableau_idx + 1} to tableau {target_tableau_idx + 1}")
+        self.move_log.append((MOVE_SUPERMOVE, source_tableau_idx, target_tableau_idx, no_cards, cards_to_move[0]))
         self.move_count += 1
 
         return True
@@ -681,38 +1122,222 @@ class BoardState:
     def is_valid_sequence(self, cards_to_move):
         """Check if the cards form a valid sequence in the tableau"""
         for i in range(1, len(cards_to_move)):
-            prev_card = cards_to_move[i - 1]
-            curr_card = cards_to_move[i]
-            if not (curr_card.value == prev_card.value - 1 and
-                    curr_card.color != prev_card.color):
+            if not CAN_STACK[cards_to_move[i].id][cards_to_move[i - 1].id]:
                 return False
         return True
 
+    def legal_moves(self):
+        """Move descriptors for every legal move, in the order the bot used to try them.
+
+        Sequence moves are emitted as single supermoves: onto a non-empty column only the run that
+        fits its top card can go, into an empty column every run length is tried, but only for the
+        first empty column since the others lead to the same canonical position."""
+        self.refresh_pile_cache()
+        moves = []
+        empty_cell = self.free_cells.index(None) if None in self.free_cells else None
+        first_empty = self.tops.index(None) if None in self.tops else None
+        capacity = self.max_supermove()
+        empty_capacity = self.max_supermove(True) if first_empty is not None else 0
+
+        for i in range(TABLEAU_COUNT):
+            pile = self.tableau[i]
+
+            if pile and empty_cell is not None:
+                moves.append((MOVE_TO_FREECELL, i, empty_cell))
+
+            for o in range(FREECELL_COUNT):
+                card = self.free_cells[o]
+                if card and self.is_valid_tableau_move(i, card):
+                    moves.append((MOVE_TO_TABLEAU, o, i))
+
+            if not pile:
+                continue
+
+            card = pile[-1]
+            if self.is_valid_foundation_move(card):
+                moves.append((MOVE_TO_FOUNDATION, i, card.id // 13))
+
+            run = self.pile_stats[i][2]
+
+            for o in range(TABLEAU_COUNT):
+                if i == o: continue
+
+                if self.is_valid_tableau_move(o, card):
+                    moves.append((MOVE_TABLEAU_TO_TABLEAU, i, o))
+
+                if run < 2: continue
+
+                target = self.tableau[o]
+                if target:
+                    count = target[-1].value - card.value
+                    if 2 <= count <= min(run, capacity) and CAN_STACK[pile[-count].id][target[-1].id]:
+                        moves.append((MOVE_SUPERMOVE, i, o, count))
+                elif o == first_empty and len(pile) > 1:
+                    # Moving the whole pile into an empty column gains nothing
+                    for count in range(2, min(run, empty_capacity, len(pile) - 1) + 1):
+                        moves.append((MOVE_SUPERMOVE, i, o, count))
+
+        for o in range(FREECELL_COUNT):
+            card = self.free_cells[o]
+            if card and self.is_valid_foundation_move(card):
+                moves.append((MOVE_FREECELL_TO_FOUNDATION, o, card.id // 13))
+
+        return moves
+
+    def apply(self, move):
+        """Play a move from legal_moves() on this board in place"""
+        kind, source, target = move[0], move[1], move[2]
+
+        if kind == MOVE_TO_FREECELL:
+            return self.move_to_freecell(source)
+        if kind == MOVE_TO_TABLEAU:
+            return self.move_to_tableau(source, target)
+        if kind == MOVE_TABLEAU_TO_TABLEAU:
+            return self.move_tableau_to_tableau(source, target)
+        if kind == MOVE_TO_FOUNDATION:
+            return self.move_to_foundation(source)
+        if kind == MOVE_SUPERMOVE:
+            return self.move_supermove(source, target, move[3])
+        return self.move_freecell_to_foundation(source)
+
+    def undo(self, move):
+        """Take back a move that was just applied, restoring the board and its keys"""
+        kind, source, target = move[0], move[1], move[2]
+
+        if kind == MOVE_TO_FREECELL:
+            card = self.free_cells[target]
+            self.free_cells[target] = None
+            self.toggle_freecell_key(target, card)
+            self.toggle_tableau_key(source, len(self.tableau[source]), card)
+            self.tableau[source].append(card)
+            self.dirty |= 1 << source
+            self.locations[card.id] = (source, len(self.tableau[source]) - 1)
+
+        elif kind == MOVE_TO_TABLEAU:
+            card = self.tableau[target].pop()
+            self.toggle_tableau_key(target, len(self.tableau[target]), card)
+            self.toggle_freecell_key(source, card)
+            self.free_cells[source] = card
+            self.dirty |= 1 << target
+            self.locations[card.id] = (FREECELL_PILE, source)
+
+        elif kind == MOVE_TABLEAU_TO_TABLEAU:
+            card = self.tableau[target].pop()
+            self.toggle_tableau_key(target, len(self.tableau[target]), card)
+            self.toggle_tableau_key(source, len(self.tableau[source]), card)
+            self.tableau[source].append(card)
+            self.dirty |= (1 << source) | (1 << target)
+            self.locations[card.id] = (source, len(self.tableau[source]) - 1)
+
+        elif kind == MOVE_SUPERMOVE:
+            from_pile, to_pile = self.tableau[target], self.tableau[source]
+            base = len(from_pile) - move[3]
+            cards = from_pile[base:]
+            for offset, card in enumerate(cards):
+                self.toggle_tableau_key(target, base + offset, card)
+                self.toggle_tableau_key(source, len(to_pile) + offset, card)
+                self.locations[card.id] = (source, len(to_pile) + offset)
+            del from_pile[base:]
+            to_pile.extend(cards)
+            self.dirty |= (1 << source) | (1 << target)
+
+        else:
+            card = self.foundations[TYPES[target]][-1]
+            self.toggle_foundation_key(card)
+            self.foundations[TYPES[target]].pop()
+            self.update_weights()
+
+            if kind == MOVE_TO_FOUNDATION:
+                self.toggle_tableau_key(source, len(self.tableau[source]), card)
+                self.tableau[source].append(card)
+                self.dirty |= 1 << source
+                self.locations[card.id] = (source, len(self.tableau[source]) - 1)
+            else:
+                self.toggle_freecell_key(source, card)
+                self.free_cells[source] = card
+                self.locations[card.id] = (FREECELL_PILE, source)
+
+        self.move_count -= 1
+        self.move_log.pop()
+
     def clone(self):
         """Create a simulation-safe copy without deck operations"""
         new_state = BoardState(
             [list(pile) for pile in self.tableau],
             list(self.free_cells),
             {suit: list(pile) for suit, pile in self.foundations.items()},
-            initialize_deck=False  # Don't create deck for clones
+            initialize_deck=False,  # Don't create deck for clones
+            key=self.key
         )
+        new_state.sym_key = self.sym_key
+        new_state.pile_keys = list(self.pile_keys)
+        new_state.cell_key = self.cell_key
         new_state.move_count = self.move_count
-        new_state.move_string = self.move_string
-        new_state.current_weights = SimpleNamespace(**self.current_weights.__dict__)
+        new_state.pile_stats = list(self.pile_stats)
+        new_state.tops = list(self.tops)
+        new_state.stacking_pairs = self.stacking_pairs
+        new_state.dirty = self.dirty
+        new_state.locations = list(self.locations)
+        new_state.phase_weights = self.phase_weights
+        new_state.phase_stagnation = self.phase_stagnation
         return new_state
 
+    def cards_left(self):
+        """Cards not on the foundations yet; each still needs at least one move"""
+        return 52 - sum(len(foundation) for foundation in self.foundations.values())
+
+    def out_of_order_cards(self):
+        """Tableau cards lying on top of a lower card, which usually have to be moved out of the way first"""
+        count = 0
+        for pile in self.tableau:
+            lowest = 14
+            for card in pile:
+                if card.value > lowest:
+                    count += 1
+                else:
+                    lowest = card.value
+        return count
+
     def is_winner(self):
         """Check if the game is won (all foundations have 13 cards)."""
         return all(len(foundation) == 13 for foundation in self.foundations.values())
 
 
 class MaxPriorityQueue:
-    def __init__(self):
+    """Open list ordered by score. With a max_size it keeps only the best nodes: once it overshoots by
+    FRONTIER_TRIM_SLACK the worst-scoring ones are evicted in one batch, beam style"""
+
+    def __init__(self, max_size=None):
         self.heap = []
+        self.max_size = max_size
+        self.trim_size = None if max_size is None else max_size + max(1, int(max_size * FRONTIER_TRIM_SLACK))
+        self.evicted = 0
+        self.peak_size = 0
+
+    @classmethod
+    def from_memory_budget(cls, megabytes):
+        """Bounded queue sized so the queued nodes fit in roughly this many MB"""
+        return cls(max(1, int(megabytes * 1024 ** 2 / FRONTIER_NODE_BYTES)))
 
     def push(self, state):
+        """Queue a node; returns the nodes evicted to make room (usually none)"""
         heapq.heappush(self.heap, (-state.get_score(), state))
 
+        if self.trim_size is not None and len(self.heap) > self.trim_size:
+            return self.trim()
+
+        self.peak_size = max(self.peak_size, len(self.heap))
+        return []
+
+    def trim(self):
+        """Drop everything but the max_size best nodes and return the dropped ones"""
+        self.peak_size = max(self.peak_size, len(self.heap))
+        self.heap.sort()
+        evicted = [state for _, state in self.heap[self.max_size:]]
+        del self.heap[self.max_size:]  # a sorted list is already a valid heap
+        self.evicted += len(evicted)
+        return evicted
+
     def pop(self):
         return heapq.heappop(self.heap)[1]
 
@@ -727,10 +1352,27 @@ class MaxPriorityQueue:
 
 
 class BotMove():
-    def __init__(self, board, previous):
-        self.score = board.calculate_heuristic(True)
+    def __init__(self, board, previous, context, moves=(), score=None):
         self.board = board
         self.previous = previous
+        self.moves = moves  # move log records that lead from previous to this board
+
+        # A given score is provisional: the full heuristic runs in evaluate() once the node reaches the front
+        self.score = score
+        self.evaluated = False
+        if score is None:
+            self.evaluate(context)
+
+    def evaluate(self, context):
+        """Replace the provisional score of a lazily queued node with the full heuristic"""
+        stats = context.stats
+        if stats is not None:
+            started = time.perf_counter()
+        self.score = self.board.calculate_heuristic(True, context)
+        self.evaluated = True
+        context.evaluations += 1
+        if stats is not None:
+            stats.add_time("heuristic", started)
 
     def get_board(self):
         return self.board
@@ -750,70 +1392,339 @@ class BotMove():
 
 class FreecellBot():
 
-    def __init__(self):
+    def __init__(self, phase_weights=None, phase_stagnation=None, max_frontier=MAX_FRONTIER_SIZE, frontier_mb=None,
+                 engine=None, lazy=LAZY_CHILD_SCORING, stats=False, store=None):
         self.start_time = time.time()
-        self.queue = MaxPriorityQueue()
+        self.store = store  # a solution_store.SolutionStore consulted before and during the search
+        self.stored_line = None  # winning line of the last search when it came (partly) from the store
+        self.collect_stats = stats
+        self.stats = None  # SearchStats of the last search when collect_stats is set
+        self.lazy = lazy
+        self.engine = engine  # a search_engines.SearchEngine; None runs the greedy best-first search below
+        self.max_frontier = max_frontier
+        self.frontier_mb = frontier_mb
+        self.queue = self.new_queue()
         self.moves = []
         self.plays = []
+        self.phase_weights = phase_weights
+        self.phase_stagnation = phase_stagnation
+        self.context = None
+        self.last_expanded = None
+        self.hint_stats = {}
 
         self.start_board = None
 
-    #simple hill climb to get best next move
+    def start_search(self, freecell):
+        """Reset the queue and give this run its own SearchContext"""
+        self.start_time = time.time()
+        self.queue = self.new_queue()
+        self.context = SearchContext(self.phase_weights, self.phase_stagnation)
+        self.stats = self.context.stats = SearchStats() if self.collect_stats else None
+        self.last_expanded = None
+        self.stored_line = None
 
-    def get_hint(self, freecell):
         self.start_board = freecell.get_board()
         self.start_board.set_starting_point()
-        self.get_possible_moves(self.start_board, None)
-        best_move = self.queue.pop()
-        return best_move # BoardState
+        self.context.bind(self.start_board)
+        self.context.closed.add(self.start_board.transposition_key())
+        if self.store is not None:
+            # Unsolvable marks must not rest on a duplicate check that merged two positions by accident
+            self.context.positions = {self.start_board.transposition_key(): self.start_board.position_code()}
 
+    #simple hill climb to get best next move
 
-    def get_possible_moves(self, state, last_move):
+    @staticmethod
+    def path_moves(bot_move):
+        """Move log records from the start board to bot_move, rebuilt from the BotMove chain"""
+        steps = []
+        while bot_move is not None:
+            steps.append(bot_move.moves)
+            bot_move = bot_move.get_previous()
+        return [record for step in reversed(steps) for record in step]
+
+    def solution_moves(self):
+        """Move log records of the winning path, also when the caller stopped iterating get_plays at the win"""
+        if self.stored_line is not None:
+            return list(self.stored_line)
+        if self.engine is not None:
+            return list(self.engine.solution or [])
+
+        winner = self.moves[0] if self.moves else self.last_expanded
+        if winner is None or not winner.get_board().is_winner():
+            return []
+        return self.path_moves(winner)
+
+    def solution_text(self):
+        return "\n".join(describe_move(record) for record in self.solution_moves())
+
+    def current_moves(self):
+        """Move log records leading to the state get_plays yielded last"""
+        if self.engine is not None:
+            return self.engine.current_moves()
+        return self.path_moves(self.last_expanded)
+
+    def solve(self, freecell, time_limit=None, max_nodes=None):
+        """Anytime solve: search until a win, time_limit seconds or max_nodes expanded states, whichever
+        comes first, and return a SolveResult. Without a win it holds the best line seen, ranked by cards
+        on the foundations, then score. Limits are checked between expansions, so one expansion (with its
+        look-ahead) may run past the deadline"""
+        deadline = time.time() + time_limit if time_limit is not None else None
+        start = time.time()
+        nodes = 0
+        reason = "exhausted"
+        best = None  # (cards home, score, line): the BotMove for the greedy search, move records for engines
+
+        plays = self.get_plays(freecell)
+        for state in plays:
+            nodes += 1
+            if state.is_winner():
+                reason = "solved"
+                break
 
-        for i in range(TABLEAU_COUNT):
+            home = 52 - state.cards_left()
+            if best is None or home >= best[0]:
+                if self.engine is None:
+                    score = self.last_expanded.get_score()
+                else:
+                    score = state.calculate_heuristic(False)
+                if best is None or (home, score) > best[:2]:
+                    # Greedy nodes link back to the start, so the path is only rebuilt for the final best
+                    best = (home, score, self.last_expanded if self.engine is None else self.engine.current_moves())
+
+            if max_nodes is not None and nodes >= max_nodes:
+                reason = "node_budget"
+                break
+            if deadline is not None and time.time() >= deadline:
+                reason = "deadline"
+                break
+        plays.close()
 
-            #All move to freecell moves
-            board = state.clone()
-            if board.move_to_freecell(i): self.queue_move(board, last_move)
+        if self.stats is not None:
+            self.stats.stop()
 
-            #All move to tableau moves
-            for o in range(FREECELL_COUNT):
-                board = state.clone()
-                if board.move_to_tableau(o, i): self.queue_move(board, last_move)
+        if reason == "solved":
+            moves = self.solution_moves()
+            score = VICTORY_SCORE
+        elif best is not None:
+            _, score, line = best
+            moves = self.path_moves(line) if self.engine is None else line
+        else:
+            moves, score = [], None
+
+        board = self.start_board.clone()
+        for record in moves:
+            board.apply(record_to_move(record))
+        return SolveResult(reason, moves, board, score, nodes, time.time() - start)
+
+    def search_stats(self):
+        """SearchStats.summary() of the last search, None unless the bot was created with stats=True"""
+        if self.stats is None:
+            return None
+        return self.stats.summary(self.context, self.queue)
+
+    def new_queue(self):
+        if self.frontier_mb is not None:
+            return MaxPriorityQueue.from_memory_budget(self.frontier_mb)
+        return MaxPriorityQueue(self.max_frontier)
+
+    def play_stored_line(self, records):
+        """End the search with a winning line read (partly) from the store; fills plays, returns the won board"""
+        self.stored_line = records
+        board = self.start_board.clone()
+        self.plays[:] = [self.start_board]
+        for record in records:
+            board.apply(record_to_move(record))
+            self.plays.append(board.clone())
+        return board
+
+    def save_solution(self, records):
+        if self.store is not None:
+            self.store.add_solution(self.start_board, records)
+
+    def save_unsolvable(self):
+        if self.store is not None:
+            self.store.add_unsolvable(self.start_board)
 
-            #All move to foundation moves
-            board = state.clone()
-            if board.move_to_foundation(i): self.queue_move(board, last_move)
+    def get_hint(self, freecell):
+        self.start_search(freecell)
+        stored = self.store.solution(self.start_board) if self.store is not None else None
+        if stored:
+            board = self.start_board.clone()
+            board.apply(record_to_move(stored[0]))
+            return BotMove(board, None, self.context, tuple(board.move_log), VICTORY_SCORE)
 
-            #Move from one tableau to another
-            for o in range(TABLEAU_COUNT):
-                if i == o: continue
+        self.get_possible_moves(self.start_board, None)
+        if self.queue.is_empty():
+            return None
+        best_move = self.pop_best()
+        return best_move # BoardState
+
+    def get_parallel_hint(self, freecell, max_depth=HINT_SEARCH_DEPTH, time_budget=HINT_TIME_BUDGET):
+        """Hint that searches the subtree of every root move on the process pool and returns the best one found
+        within time_budget, as a BotMove. Falls back to the one-ply scores when no search finished"""
+        self.start_search(freecell)
+        deadline = time.time() + time_budget
+
+        children = root_children(self.start_board)
+        if not children:
+            return None
+
+        try:
+            pool = get_hint_pool()
+            # Most promising moves first, so they are the ones searched when there are fewer cores than moves
+            ordered = sorted(children, key=lambda k: children[k][2], reverse=True)
+            futures = {pool.submit(search_subtree, children[key][0], max_depth, time_budget, deadline): key
+                       for key in ordered}
+            done, not_done = wait(futures, timeout=max(0.0, deadline - time.time()))
+            for future in not_done:
+                future.cancel()
+            errors = [future.exception() for future in done]
+            if any(isinstance(error, BrokenProcessPool) for error in errors):
+                raise BrokenProcessPool("a hint worker died")
+            searched = {futures[future]: future.result() for future, error in zip(done, errors) if error is None}
+        except BrokenProcessPool:
+            shutdown_hint_pool()  # a worker died; start a fresh pool next time and use the one-ply scores now
+            searched = {}
+
+        # Tasks that only started once the deadline had passed return their one-ply score; leave them out
+        # when other moves were searched deeper, and compare the rest at the depth all of them reached
+        deeper = {key: scores for key, scores in searched.items() if len(scores) > 1}
+        searched = deeper or searched
+        if searched:
+            key, score, depth = best_at_common_depth(searched)
+        else:
+            key = max(children, key=lambda k: children[k][2])
+            score, depth = children[key][2], 0
+        self.hint_stats = {
+            "root_moves": len(children),
+            "searched": len(searched),
+            "depth": depth,
+        }
+
+        child, moves, _ = children[key]
+        return BotMove(child, None, self.context, moves, score)
+
+    def provisional_score(self, board, parent, moves):
+        """Cheap priority for a lazily queued child: its parent's score, adjusted for what the step itself did"""
+        weights = board.current_weights
+        home = sum(1 for record in moves if record[0] in (MOVE_TO_FOUNDATION, MOVE_FREECELL_TO_FOUNDATION))
+        return parent.get_score() + home * weights.FOUNDATION_MULTIPLIER - len(moves) * weights.MOVE_COUNT_SCORE
+
+    def push(self, bot_move):
+        for evicted in self.queue.push(bot_move):
+            # Forget evicted positions so the search may reach them again by another path
+            key = evicted.get_board().transposition_key()
+            self.context.closed.discard(key)
+            if self.context.positions is not None:
+                self.context.positions.pop(key, None)
+
+    def pop_best(self):
+        """Pop the best node, scoring lazily queued nodes as they reach the front of the queue"""
+        while True:
+            bot_move = self.queue.pop()
+            if bot_move.evaluated:
+                return bot_move
+
+            bot_move.evaluate(self.context)
+            front = self.queue.peek()
+            if front is None or bot_move.get_score() >= -front[0]:
+                return bot_move
+
+            self.context.requeued += 1
+            self.push(bot_move)
+
+
+    def get_engine_plays(self):
+        """get_plays for a pluggable engine: yields the states it expands, then replays its solution into plays"""
+        for state in self.engine.search(self.start_board, self.context):
+            self.context.expanded += 1
+            if self.engine.solution is not None:
+                self.save_solution(self.engine.solution)
+            yield state
+
+        # No unsolvable mark when the engine runs dry: its duplicate tables go by key alone, unchecked
+
+        if self.engine.solution is not None:
+            board = self.start_board.clone()
+            self.plays.append(self.start_board)
+            for record in self.engine.solution:
+                board.apply(record_to_move(record))
+                self.plays.append(board.clone())
+
+        print("\nWINNING MOVES: ")
+        print(self.solution_text())
+        if self.stats is not None:
+            print("\n{}: {} states expanded, {} duplicates skipped".format(self.engine.name, self.context.expanded,
+                                                                            self.context.dedupe["queue"]))
 
-                board = state.clone()
-                if board.move_tableau_to_tableau(i, o): self.queue_move(board, last_move)
+    def get_possible_moves(self, state, last_move):
 
+        # Moves are played and taken back on one working copy, so the popped state is never touched
+        board = state.clone()
+        stats = self.stats
+        if stats is not None:
+            stats.clones += 1
+            started = time.perf_counter()
 
-        #Move from the freecell to the foundation
-        for i in range(FREECELL_COUNT):
-            board = state.clone()
-            if board.move_freecell_to_foundation(i): self.queue_move(board, last_move)
+        moves = board.legal_moves()
+        if stats is not None:
+            stats.add_time("move_generation", started)
+            stats.generated += len(moves)
+
+        for move in moves:
+            played = board.apply_with_auto_play(move)
+            self.queue_move(board, last_move)
+            board.undo_all(played)
 
     def queue_move(self, board, state):
+        """Queue a copy of board unless an equivalent position was already queued"""
+        stats = self.stats
+        if stats is not None:
+            started = time.perf_counter()
+
+        key = board.transposition_key()
+        if stats is not None:
+            stats.add_time("hashing", started)
+
+        positions = self.context.positions
+        if key in self.context.closed:
+            self.context.dedupe["queue"] += 1
+            if positions is not None and positions.get(key) != board.position_code():
+                self.context.key_collisions += 1
+            return
+
+        self.context.closed.add(key)
+        if positions is not None:
+            positions[key] = board.position_code()
 
-        if board in previousSet: return
+        moves = tuple(board.move_log)
+        score = None  # children of the start board are scored right away, there is no parent score to go on
+        if self.lazy and state is not None:
+            score = self.provisional_score(board, state, moves)
 
+        if stats is not None:
+            stats.clones += 1
 
-        previousSet.add(board)
-        self.queue.push(BotMove(board, state))
+        self.push(BotMove(board.clone(), state, self.context, moves, score))
 
     def get_plays(self, freecell):
 
         self.plays.clear()
-        previousSet.clear()
-
-        self.start_board = freecell.get_board()
-        self.start_board.set_starting_point()
-        previousSet.add(self.start_board)
+        self.moves.clear()
+        self.start_search(freecell)
+
+        if self.store is not None:
+            stored = self.store.solution(self.start_board)
+            if stored is not None:
+                yield self.play_stored_line(stored)
+                return
+            if self.store.is_unsolvable(self.start_board):
+                print("\nThis deal is stored as unsolvable")
+                return
+
+        if self.engine is not None:
+            yield from self.get_engine_plays()
+            return
 
         self.get_possible_moves(self.start_board, None)
 
@@ -823,15 +1734,32 @@ class FreecellBot():
         while self.queue.size() > 0:
 
 
-            highest_move = self.queue.pop()
+            highest_move = self.pop_best()
             state = highest_move.get_board()
 
+            self.context.expanded += 1
+            self.last_expanded = highest_move
+            if self.stats is not None and self.context.expanded % STATS_FRONTIER_INTERVAL == 0:
+                self.stats.frontier_samples.append((self.context.expanded, self.queue.size()))
+
+            if self.store is not None:
+                if state.is_winner():
+                    self.save_solution(self.path_moves(highest_move))
+                else:
+                    # A position of a stored line: the rest of the solution is already known
+                    remainder = self.store.solution(state)
+                    if remainder is not None:
+                        line = self.path_moves(highest_move) + remainder
+                        self.save_solution(line)
+                        yield self.play_stored_line(line)
+                        break
+
             yield state
 
             # print("\n-----------------------------")
             #print("Queue Size: ", self.queue.size())
             #print("Heuristic Value: ", state.calculate_heuristic())
-           # print("Previous Size: ", len(previousSet))
+           # print("Previous Size: ", len(self.context.closed))
 
 
             if state.is_winner():
@@ -848,6 +1776,10 @@ class FreecellBot():
             self.get_possible_moves(state, highest_move)
 
 
+        if (not self.moves and self.stored_line is None and self.queue.evicted == 0
+                and self.context.key_collisions == 0):
+            self.save_unsolvable()  # the queue ran dry without dropping or merging anything: no position left to try
+
         if len(self.moves) > 0:
 
             while self.moves[-1] is not None:
@@ -858,10 +1790,33 @@ class FreecellBot():
             self.plays.reverse()
 
         mem_after = process.memory_info().rss
+        if self.stats is not None:
+            self.stats.stop()
 
         print("\nWINNING MOVES: ")
-        print(state.move_string)
+        print(self.solution_text())
 
         print("\nMemory usage before bot Algorithm: {:.2f} MB".format(mem_before / 1024 ** 2))
         print("Memory usage after bot Algorithm: {:.2f} MB".format(mem_after / 1024 ** 2))
 
+        # The counters below are also in search_stats(); only print them when they were asked for
+        if self.stats is not None:
+            if self.queue.max_size is not None:
+                print("\nFrontier: {} nodes evicted, peak size {} (limit {})".format(self.queue.evicted,
+                                                                                  self.queue.peak_size,
+                                                                                  self.queue.max_size))
+
+            print("\nHeuristic evaluations: {} ({} lazily scored nodes requeued)".format(self.context.evaluations,
+                                                                                       self.context.requeued))
+
+            table = self.context.look_ahead_table
+            print("\nLook-ahead table: {:.1%} hit rate ({} hits, {} misses), {} entries, {} evicted".format(
+                table.hit_rate(), table.hits, table.misses, len(table), table.evictions))
+
+            print("\nDuplicates collapsed: {} queued, {} in look-ahead".format(self.context.dedupe["queue"],
+                                                                                  self.context.dedupe["look_ahead"]))
+
+            timers = self.stats.timers
+            print("\nTime: {:.2f}s, of which {:.2f}s move generation, {:.2f}s hashing, {:.2f}s heuristic".format(
+                self.stats.elapsed, timers["move_generation"], timers["hashing"], timers["heuristic"]))
+
@@ -2,20 +2,31 @@ import copy
 from copy import deepcopy
 
 from freecell_bot import BoardState, FreecellBot
+from compact_state import CompactBoardState
 from constants import *
 import time
 
 
 # Freecell logic
 class FreeCell:
-    def __init__(self):
+    def __init__(self, compact=False, deal=None):
 
-        self.tableau = [[] for _ in range(TABLEAU_COUNT)]
-        self.free_cells = [None] * 4
-        self.foundations = {suit: [] for suit in TYPES}
+        if deal is not None:  # Microsoft FreeCell deal number
+            self.board_state = BoardState.from_deal(deal)
+            self.tableau = self.board_state.tableau
+            self.free_cells = self.board_state.free_cells
+            self.foundations = self.board_state.foundations
+        else:
+            self.tableau = [[] for _ in range(TABLEAU_COUNT)]
+            self.free_cells = [None] * 4
+            self.foundations = {suit: [] for suit in TYPES}
+
+            self.board_state = BoardState(self.tableau, self.free_cells, self.foundations, initialize_deck=True)
+            self.board_state.deal_cards()
 
-        self.board_state = BoardState(self.tableau, self.free_cells, self.foundations, initialize_deck=True)
-        self.board_state.deal_cards()
+        self.deal = deal
+        if compact:
+            self.board_state = CompactBoardState.from_board_state(self.board_state)
         self.history = []
 
     def get_board(self):
@@ -6,7 +6,8 @@ import sys
 from constants import TYPES, RANKS
 from pygame.locals import *
 from freecell_game import FreeCell
-from freecell_bot import FreecellBot
+from freecell_bot import FreecellBot, shutdown_hint_pool
+from hint_engine import HintEngine
 
 # Constants
 SCREEN_WIDTH = 800
@@ -50,6 +51,7 @@ class FreeCellGUI:
         self.show_game = False
         self.bot_thread = None
         self.bot_moves = queue.Queue()
+        self.hint_engine = None
         
         # Card dragging
         self.dragging = False
@@ -116,6 +118,7 @@ class FreeCellGUI:
         self.show_main_menu = False
         self.show_game = True
         self.bot = FreecellBot()
+        self.hint_engine = HintEngine() if mode == "human" else None
 
         if mode == "bot":
             self.bot_moves = queue.Queue()
@@ -319,6 +322,7 @@ class FreeCellGUI:
         
         for event in pygame.event.get():
             if event.type == QUIT:
+                shutdown_hint_pool()
                 pygame.quit()
                 sys.exit()
             
@@ -365,8 +369,13 @@ class FreeCellGUI:
                 elif event.key == K_r:  # Reset
                     self.init_game(self.current_mode)
                 elif event.key == K_h:
-                    best_botmove = self.bot.get_hint(self.game)
-                    self.game.board_state = best_botmove.get_board()
+                    # Pondered hints are instant; a position not pondered yet gets the one-ply hint rather than
+                    # a search that would hold up the event loop
+                    best_botmove = self.hint_engine.hint(self.game.board_state) if self.hint_engine else None
+                    if best_botmove is None:
+                        best_botmove = self.bot.get_hint(self.game)
+                    if best_botmove is not None:
+                        self.game.board_state = best_botmove.get_board()
 
     def run_bot_move(self):
         """Execute a single bot move"""
@@ -381,6 +390,7 @@ class FreeCellGUI:
                 
                 for event in pygame.event.get():
                     if event.type == QUIT:
+                        shutdown_hint_pool()
                         pygame.quit()
                         sys.exit()
                     
@@ -400,6 +410,8 @@ class FreeCellGUI:
                         pass
 
                 self.handle_game_events()
+                if self.hint_engine is not None and not self.dragging:
+                    self.hint_engine.update(self.game.board_state)
                 self.draw_game()
             
             self.clock.tick(60)
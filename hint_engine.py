@@ -0,0 +1,184 @@
+# hint_engine.py
+"""Hints that are ready before the player asks for them.
+
+HintEngine.update(board) is called every frame. While the player thinks, it searches their position on the
+hint process pool (search_subtree for every root move, as in FreecellBot.get_parallel_hint), then follows the
+hinted moves a few plies ahead, then goes back and searches the position one ply deeper. Every root move gets
+task_budget seconds of its own; a position whose moves do not all get through a depth in that time is not
+searched deeper again. Best moves are cached by transposition key, so a hint for any position pondered so far is a dictionary lookup, also after the player
+reaches a position the ponderer expected.
+
+The key does not depend on column or free cell order, so the player may reach a cached position with the cards
+placed differently. Moves are therefore cached by card, as in the solution store, and played on the player's
+own board.
+"""
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+
+from constants import *
+from freecell_bot import (BotMove, best_at_common_depth, get_hint_pool, record_to_move, root_children, search_subtree,
+                          shutdown_hint_pool)
+from solution_store import board_move, portable_move
+
+
+def portable_line(board, records):
+    """Move log records played from board, as (card, target kind, target card) moves"""
+    board = board.clone()
+    line = []
+    for record in records:
+        line.append(portable_move(board, record))
+        board.apply(record_to_move(record))
+    return tuple(line)
+
+
+def play_line(board, line):
+    """Clone of board with a portable line played on it, None if a move does not fit"""
+    board = board.clone()
+    for move in line:
+        descriptor = board_move(board, move)
+        if descriptor is None or not board.apply(descriptor):
+            return None
+    return board
+
+
+class HintEngine:
+    def __init__(self, max_depth=PONDER_MAX_DEPTH, follow_plies=PONDER_FOLLOW_PLIES, cache_size=HINT_CACHE_SIZE,
+                 task_budget=PONDER_TASK_BUDGET):
+        self.max_depth = max_depth
+        self.follow_plies = follow_plies
+        self.cache_size = cache_size
+        self.task_budget = task_budget
+        self.cache = OrderedDict()  # transposition key -> (portable moves, score, depth)
+        self.depth_limits = OrderedDict()  # transposition key -> deepest depth the task budget gets through
+
+        self.root_key = None  # the player's position
+        self.root_board = None
+        self.next_job = None  # (board, depth, plies ahead of the player) to search once the workers are free
+        self.job = None  # (key, board, depth, plies, children) being searched
+        self.futures = {}  # future -> child key
+        self.broken = False
+
+    def hint(self, board):
+        """Best known move from board as a BotMove played on board, None when the position has not been
+        pondered yet"""
+        key = board.transposition_key()
+        child = self.cached_child(board)
+        if child is None:
+            return None
+        self.cache.move_to_end(key)
+        return BotMove(child, None, None, tuple(child.move_log), self.cache[key][1])
+
+    def cached_child(self, board):
+        """Board after the cached best move of its position, None if there is none (or it does not fit)"""
+        entry = self.cache.get(board.transposition_key())
+        return play_line(board, entry[0]) if entry is not None else None
+
+    def cached_depth(self, key):
+        entry = self.cache.get(key)
+        return entry[2] if entry is not None else 0
+
+    def depth_cap(self, key):
+        return min(self.max_depth, self.depth_limits.get(key, self.max_depth))
+
+    def update(self, board):
+        """Follow the player's position and keep the workers busy; never blocks"""
+        if self.broken:
+            return
+
+        key = board.transposition_key()
+        if key != self.root_key:
+            # The player moved: whatever was planned for the old position is stale. Tasks already running
+            # cannot be stopped and finish within task_budget; their results still go to the cache
+            self.root_key = key
+            self.root_board = board.clone()
+            for future in self.futures:
+                future.cancel()
+            self.next_job = (self.root_board, min(self.cached_depth(key) + 1, self.max_depth), 0)
+
+        if self.job is not None and all(future.done() for future in self.futures):
+            self.finish_job()
+
+        while self.job is None and self.next_job is not None:
+            self.start_job(*self.next_job)
+
+    def start_job(self, board, depth, plies):
+        key = board.transposition_key()
+        self.next_job = None
+        if self.cached_depth(key) >= depth or depth > self.depth_cap(key):
+            self.plan_after(board, depth, plies)  # known already, or out of reach; move on without searching
+            return
+
+        children = root_children(board) if not board.is_winner() else {}
+        if not children:
+            if plies:
+                self.plan_after(board, depth, plies)  # a dead end ahead of the player; deepen the position
+            return
+
+        try:
+            pool = get_hint_pool()
+            self.futures = {pool.submit(search_subtree, children[child_key][0], depth, self.task_budget): child_key
+                            for child_key in children}
+        except BrokenProcessPool:
+            self.stop()
+            return
+        self.job = (key, board, depth, plies, children)
+
+    def finish_job(self):
+        key, board, depth, plies, children = self.job
+        results = {}
+        for future, child_key in self.futures.items():
+            if future.cancelled():
+                continue
+            error = future.exception()  # a dead worker is reported here, not raised
+            if isinstance(error, BrokenProcessPool):
+                self.stop()
+                return
+            if error is None:
+                results[child_key] = future.result()
+        self.job = None
+        self.futures = {}
+
+        # Only a search that covered every root move says which one is best, and only at the depth all of
+        # them got through within their budget
+        if len(results) == len(children):
+            best, score, reached = best_at_common_depth(results)
+            if reached > 0:
+                _, moves, _ = children[best]
+                self.store(key, (portable_line(board, moves), score, reached))
+            if reached < depth:
+                self.limit_depth(key, reached)
+
+        if self.next_job is None:  # not superseded by a player move meanwhile
+            self.plan_after(board, depth, plies)
+
+    def plan_after(self, board, depth, plies):
+        """Follow the hinted move ahead of the player, then deepen the player's position"""
+        child = self.cached_child(board) if plies < self.follow_plies else None
+        if child is not None and not child.is_winner():
+            self.next_job = (child, depth, plies + 1)
+        elif self.cached_depth(self.root_key) < self.depth_cap(self.root_key):
+            self.next_job = (self.root_board, self.cached_depth(self.root_key) + 1, 0)
+        else:
+            self.next_job = None  # searched as deep as allowed; idle until the player moves
+
+    def store(self, key, entry):
+        if self.cached_depth(key) > entry[2]:
+            return  # a deeper result from an earlier visit is worth more
+        self.cache[key] = entry
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def limit_depth(self, key, depth):
+        self.depth_limits[key] = depth
+        self.depth_limits.move_to_end(key)
+        while len(self.depth_limits) > self.cache_size:
+            self.depth_limits.popitem(last=False)
+
+    def stop(self):
+        """A worker died: drop the pool and stop pondering; hint() keeps answering from the cache"""
+        shutdown_hint_pool()
+        self.broken = True
+        self.job = None
+        self.next_job = None
+        self.futures = {}
@@ -0,0 +1,169 @@
+# profiling.py
+"""Opt-in profiling of solves: wall-clock timers around every heuristic component and the move generator,
+and a cProfile dump per deal. Nothing here is active unless a solve asks for it.
+
+    python batch_solve.py --seeds 1-5 --ms --component-timers       # timers in every JSONL record
+    python batch_solve.py --seeds 617 --ms --profile-dir profiles   # profiles/ms-617.prof + ms-617.json
+    python profiling.py profiles/ms-617.json new/ms-617.json        # compare two runs component by component
+
+Times are inclusive: a scorer that refreshes the pile cache also counts that refresh. Work done inside a
+look-ahead is kept apart under look_ahead/<component>, so the look-ahead cost can be split by component too.
+With --profile-dir the timers run under cProfile and include its overhead; compare runs made the same way.
+"""
+import argparse
+import functools
+import json
+import os
+import pstats
+import sys
+import time
+
+from compact_state import CompactBoardState
+from freecell_bot import BoardState
+
+# component name -> board method; both state classes implement all of them except the BoardState pile cache
+SCORERS = {
+    "foundation": "get_foundation_score",
+    "free_cells": "get_free_cell_score",
+    "empty_tableau": "get_tableau_empty_score",
+    "tableau_order": "get_tableau_order_score",
+    "excavation": "card_excavation_score",
+    "chains": "get_sequential_chains_score",
+    "blocked_cards": "get_blocked_cards_penalty",
+    "balance": "get_balanced_foundation_score",
+    "potential_moves": "get_potential_moves_score",
+}
+COMPONENTS = {
+    **SCORERS,
+    "heuristic": "calculate_heuristic",
+    "move_generation": "legal_moves",
+    "play": "apply_with_auto_play",
+    "take_back": "undo_all",
+    "hashing": "transposition_key",
+    "clone": "clone",
+    "pile_cache": "refresh_pile_cache",
+}
+LOOK_AHEAD = "look_ahead"
+LOOK_AHEAD_METHOD = "improved_look_ahead_score_boost"
+
+PROFILE_TOP_FUNCTIONS = 40  # functions kept in the JSON summary of a cProfile run, by own time
+
+
+class ComponentTimers:
+    """Context manager that wraps the component methods of the board classes with timers while it is active
+    and puts the originals back on exit, so solves outside it run the plain code"""
+
+    def __init__(self, board_classes=(BoardState, CompactBoardState)):
+        self.board_classes = board_classes
+        self.seconds = {}
+        self.calls = {}
+        self.look_ahead_depth = 0
+        self.originals = []
+
+    def __enter__(self):
+        for cls in self.board_classes:
+            for component, name in COMPONENTS.items():
+                if name in vars(cls):
+                    self.patch(cls, name, self.timed(component, vars(cls)[name]))
+            if LOOK_AHEAD_METHOD in vars(cls):
+                self.patch(cls, LOOK_AHEAD_METHOD, self.timed_look_ahead(vars(cls)[LOOK_AHEAD_METHOD]))
+        return self
+
+    def __exit__(self, *exc_info):
+        for cls, name, original in reversed(self.originals):
+            setattr(cls, name, original)
+        self.originals.clear()
+        return False
+
+    def patch(self, cls, name, replacement):
+        self.originals.append((cls, name, vars(cls)[name]))
+        setattr(cls, name, replacement)
+
+    def record(self, component, started):
+        self.seconds[component] = self.seconds.get(component, 0.0) + time.perf_counter() - started
+        self.calls[component] = self.calls.get(component, 0) + 1
+
+    def timed(self, component, method):
+        timers = self
+        nested = f"{LOOK_AHEAD}/{component}"
+
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timers.record(nested if timers.look_ahead_depth else component, started)
+
+        return timed_method
+
+    def timed_look_ahead(self, method):
+        """The look-ahead recurses; only the outermost call of each trigger is timed"""
+        timers = self
+
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            timers.look_ahead_depth += 1
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timers.look_ahead_depth -= 1
+                if not timers.look_ahead_depth:
+                    timers.record(LOOK_AHEAD, started)
+
+        return timed_method
+
+    def summary(self):
+        """{component: {"calls": n, "seconds": s}}, sorted by name so two runs diff line by line"""
+        return {component: {"calls": self.calls[component], "seconds": round(self.seconds[component], 6)}
+                for component in sorted(self.seconds)}
+
+
+def function_label(function):
+    file_name, line, name = function
+    return f"{os.path.basename(file_name)}:{line}({name})"
+
+
+def profile_summary(profiler, limit=PROFILE_TOP_FUNCTIONS):
+    """The limit functions with the most own time: {"file:line(name)": {"calls", "tottime", "cumtime"}}"""
+    stats = pstats.Stats(profiler).stats
+    top = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return {function_label(function): {"calls": calls, "tottime": round(tottime, 6), "cumtime": round(cumtime, 6)}
+            for function, (_, calls, tottime, cumtime, _) in sorted(top)}
+
+
+def write_profile(directory, label, profiler, record):
+    """<label>.prof for pstats/snakeviz and <label>.json with the record, its timers and the top functions"""
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, label)
+    profiler.dump_stats(base + ".prof")
+    with open(base + ".json", "w") as out:
+        json.dump({**record, "functions": profile_summary(profiler)}, out, indent=2, sort_keys=True)
+    return base + ".json"
+
+
+def compare_components(old, new):
+    """(component, old seconds, new seconds) for every component of either run, biggest change first"""
+    names = set(old) | set(new)
+    rows = [(name, old.get(name, {}).get("seconds", 0.0), new.get(name, {}).get("seconds", 0.0)) for name in names]
+    return sorted(rows, key=lambda row: abs(row[2] - row[1]), reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the component timers of two profiled solves")
+    parser.add_argument("old", help="profile JSON written by batch_solve --profile-dir")
+    parser.add_argument("new")
+    args = parser.parse_args(argv)
+
+    with open(args.old) as old_file, open(args.new) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+
+    print(f"{'component':32} {'old s':>10} {'new s':>10} {'change':>8}")
+    for name, before, after in compare_components(old.get("components", {}), new.get("components", {})):
+        change = f"{(after - before) / before:+.1%}" if before else "new"
+        print(f"{name:32} {before:10.4f} {after:10.4f} {change:>8}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
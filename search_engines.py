@@ -0,0 +1,208 @@
+# search_engines.py
+"""Pluggable search engines for FreecellBot(engine=...).
+
+Both engines use the same move generator as the greedy bot (legal_moves / apply_with_auto_play / undo_all)
+and order nodes by f = g + w * h, with g the number of moves played so far:
+
+- WeightedAStarEngine: best-first on f with a closed table of the cheapest g per position. w = 1 with the
+  admissible heuristic gives shortest solutions; a larger w trades solution length for speed.
+- IDAStarEngine: iterative deepening on f, depth-first with apply/undo on a single board. Memory stays
+  proportional to the solution length plus an optional bounded transposition table.
+"""
+import heapq
+import itertools
+from abc import ABC, abstractmethod
+
+from constants import *
+from freecell_bot import FreecellBot
+
+
+def admissible_heuristic(board):
+    """Every card still out needs its own foundation move, so this never overestimates"""
+    return board.cards_left()
+
+
+def informed_heuristic(board):
+    """Cards left plus cards lying on a lower card; not admissible, but a much better guide"""
+    return board.cards_left() + board.out_of_order_cards()
+
+
+HEURISTICS = {
+    "admissible": admissible_heuristic,
+    "informed": informed_heuristic,
+}
+
+
+class SearchNode:
+    """Node of the A* tree; get_board/get_previous/moves match BotMove so FreecellBot.path_moves can walk it"""
+    __slots__ = ('board', 'previous', 'moves', 'g')
+
+    def __init__(self, board, previous, moves, g):
+        self.board = board
+        self.previous = previous
+        self.moves = moves
+        self.g = g
+
+    def get_board(self):
+        return self.board
+
+    def get_previous(self):
+        return self.previous
+
+
+class SearchEngine(ABC):
+    """Base engine. search() is a generator over the expanded states; once it finds a win it sets
+    self.solution to the move log records from the start board, before yielding the winning state.
+    current_moves() gives the records that lead to the state yielded last"""
+    name = "engine"
+
+    def __init__(self, weight=1.0, heuristic="informed"):
+        if heuristic not in HEURISTICS:
+            raise ValueError(f"Unknown heuristic {heuristic!r}, expected one of {sorted(HEURISTICS)}")
+        self.weight = weight
+        self.heuristic = HEURISTICS[heuristic]
+        self.solution = None
+
+    def f_score(self, board):
+        return board.move_count + self.weight * self.heuristic(board)
+
+    @abstractmethod
+    def search(self, start_board, context):
+        """Generator over the expanded states of a search from start_board"""
+
+    @abstractmethod
+    def current_moves(self):
+        """Move log records from the start board to the state yielded last"""
+
+
+class WeightedAStarEngine(SearchEngine):
+    name = "wastar"
+
+    def __init__(self, weight=1.0, heuristic="informed"):
+        super().__init__(weight, heuristic)
+        self.current = None
+
+    def current_moves(self):
+        return FreecellBot.path_moves(self.current) if self.current is not None else []
+
+    def search(self, start_board, context):
+        self.solution = None
+        tie_breaker = itertools.count()  # keeps equal-f entries in insertion order without comparing nodes
+
+        root = SearchNode(start_board.clone(), None, (), start_board.move_count)
+        best_g = {start_board.transposition_key(): root.g}
+        open_list = [(self.f_score(root.board), next(tie_breaker), root)]
+
+        while open_list:
+            _, _, node = heapq.heappop(open_list)
+            board = node.board
+
+            if best_g.get(board.transposition_key(), node.g) < node.g:
+                continue  # a cheaper path to this position was queued after this one
+
+            self.current = node
+            if board.is_winner():
+                self.solution = FreecellBot.path_moves(node)
+                yield board
+                return
+
+            yield board
+
+            working = board.clone()
+            for move in working.legal_moves():
+                played = working.apply_with_auto_play(move)
+
+                key = working.transposition_key()
+                g = working.move_count
+                if best_g.get(key, float('inf')) <= g:
+                    context.dedupe["queue"] += 1
+                else:
+                    best_g[key] = g
+                    child = SearchNode(working.clone(), node, tuple(working.move_log), g)
+                    heapq.heappush(open_list, (self.f_score(working), next(tie_breaker), child))
+
+                working.undo_all(played)
+
+
+class IDAStarEngine(SearchEngine):
+    name = "idastar"
+
+    def __init__(self, weight=1.0, heuristic="informed", table_size=100000):
+        super().__init__(weight, heuristic)
+        self.table_size = table_size  # positions remembered per iteration; 0 keeps only the current path
+        self.board = None
+
+    def current_moves(self):
+        # The working board is played from a clone of the start board, so its log is the whole path
+        return list(self.board.move_log) if self.board is not None else []
+
+    def search(self, start_board, context):
+        """Yields the single working board, which keeps changing; clone it to keep a state"""
+        self.solution = None
+        board = self.board = start_board.clone()
+        bound = self.f_score(board)
+
+        while bound != float('inf'):
+            self.next_bound = float('inf')
+            self.seen = {}
+            path = {board.transposition_key()}
+
+            yield from self.bounded_search(board, bound, path, context)
+            if self.solution is not None:
+                return
+            bound = self.next_bound
+
+    def bounded_search(self, board, bound, path, context):
+        """Depth-first search of every position with f <= bound"""
+        if board.is_winner():
+            self.solution = list(board.move_log)
+            yield board
+            return
+
+        yield board
+
+        children = []
+        for move in board.legal_moves():
+            played = board.apply_with_auto_play(move)
+            f = self.f_score(board)
+            key = board.transposition_key()
+
+            if key in path or self.seen.get(key, float('inf')) <= board.move_count:
+                context.dedupe["queue"] += 1
+            elif f > bound:
+                self.next_bound = min(self.next_bound, f)
+            else:
+                if len(self.seen) < self.table_size:
+                    self.seen[key] = board.move_count
+                children.append((f, len(children), move))
+
+            board.undo_all(played)
+
+        # Most promising children first, so a solution under the bound is found early
+        children.sort()
+        for _, _, move in children:
+            played = board.apply_with_auto_play(move)
+            key = board.transposition_key()
+            path.add(key)
+
+            yield from self.bounded_search(board, bound, path, context)
+
+            path.discard(key)
+            if self.solution is not None:
+                return
+            board.undo_all(played)
+
+
+ENGINES = {
+    WeightedAStarEngine.name: WeightedAStarEngine,
+    IDAStarEngine.name: IDAStarEngine,
+}
+
+
+def make_engine(name, weight=1.0, heuristic="informed"):
+    """Engine by name, as used on the command line; "greedy" (or None) keeps FreecellBot's own search"""
+    if name in (None, "greedy"):
+        return None
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine {name!r}, expected greedy or one of {sorted(ENGINES)}")
+    return ENGINES[name](weight, heuristic)
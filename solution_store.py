@@ -0,0 +1,201 @@
+# solution_store.py
+"""Solutions kept on disk between runs, in SQLite, so a deal (or any position on a solved line) is solved once.
+
+Every position of a stored line gets a row keyed by canonical_key(): the next move and the number of moves left,
+so reaching any of them, from any deal, gives the rest of the solution by following the rows. Positions a
+complete search proved unsolvable are stored as well.
+
+The canonical key ignores column and free cell order, so a row may be read for a position whose columns are
+ordered differently from the one that was stored. Moves are therefore stored by card rather than by column:
+(card moved, where to, card it goes on), and mapped back to columns on the board being solved.
+
+Keys can collide, so every row also holds the position_code() of its position and a row is only used for a
+board with the same code.
+"""
+import sqlite3
+
+from constants import *
+from freecell_bot import (FREECELL_PILE, MOVE_TO_FREECELL, MOVE_TO_TABLEAU, MOVE_TABLEAU_TO_TABLEAU,
+                          MOVE_TO_FOUNDATION, MOVE_FREECELL_TO_FOUNDATION, MOVE_SUPERMOVE, record_to_move)
+
+# Where a stored move goes
+TO_FREECELL = 0
+TO_FOUNDATION = 1
+TO_TABLEAU = 2
+NO_CARD = -1  # target card of a move into an empty column
+
+# Stored as the file's user_version; rows of an older layout (or older keys) are dropped on open
+STORE_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    key INTEGER PRIMARY KEY,    -- canonical_key() as a signed 64-bit integer
+    position BLOB NOT NULL,     -- position_code() of the position the row is about
+    solvable INTEGER NOT NULL,  -- 1 with a solution, 0 proven unsolvable
+    card INTEGER,               -- next move of the solution: card id moved,
+    target_kind INTEGER,        -- TO_FREECELL, TO_FOUNDATION or TO_TABLEAU,
+    target_card INTEGER,        -- card id it goes on in the tableau, NO_CARD for an empty column
+    remaining INTEGER           -- moves left to the win from this position
+)
+"""
+
+# Keep the shorter remainder when a position is reached again; a solution always replaces an unsolvable mark
+# and the row of another position that had the same key
+UPSERT = """
+INSERT INTO positions (key, position, solvable, card, target_kind, target_card, remaining)
+VALUES (?, ?, 1, ?, ?, ?, ?)
+ON CONFLICT(key) DO UPDATE SET position = excluded.position, solvable = 1, card = excluded.card,
+    target_kind = excluded.target_kind, target_card = excluded.target_card, remaining = excluded.remaining
+WHERE positions.position != excluded.position OR positions.solvable = 0 OR excluded.remaining < positions.remaining
+"""
+
+
+def store_key(board):
+    key = board.canonical_key()
+    return key - (1 << 64) if key >= 1 << 63 else key  # SQLite integers are signed
+
+
+def card_id(card):
+    """Card id of a pile or free cell entry of either state class, None for an empty free cell"""
+    if card is None or card == 0xFF:
+        return None
+    return card if isinstance(card, int) else card.id
+
+
+def locate(board, card):
+    """(pile, depth) of a card, (FREECELL_PILE, cell) in a free cell, as in BoardState.locations; None if home"""
+    for i, cell in enumerate(board.free_cells):
+        if card_id(cell) == card:
+            return FREECELL_PILE, i
+    for i, pile in enumerate(board.tableau):
+        for depth, entry in enumerate(pile):
+            if card_id(entry) == card:
+                return i, depth
+    return None
+
+
+def portable_move(board, record):
+    """(card, target kind, target card) of a move log record, read on the board it is about to be played on"""
+    kind, source, target, count, card = record
+    if kind == MOVE_TO_FREECELL:
+        return card.id, TO_FREECELL, NO_CARD
+    if kind in (MOVE_TO_FOUNDATION, MOVE_FREECELL_TO_FOUNDATION):
+        return card.id, TO_FOUNDATION, NO_CARD
+
+    pile = board.tableau[target]
+    return card.id, TO_TABLEAU, card_id(pile[-1]) if pile else NO_CARD
+
+
+def board_move(board, move):
+    """Move descriptor that plays a stored (card, target kind, target card) move on board, None if it cannot"""
+    card, target_kind, target_card = move
+    where = locate(board, card)
+    if where is None:
+        return None
+    pile, depth = where
+    on_top = pile == FREECELL_PILE or depth == len(board.tableau[pile]) - 1
+
+    if target_kind in (TO_FOUNDATION, TO_FREECELL) and not on_top:
+        return None  # single card moves take the top card of the pile
+    if target_kind == TO_FOUNDATION:
+        if pile == FREECELL_PILE:
+            return MOVE_FREECELL_TO_FOUNDATION, depth, card // 13
+        return MOVE_TO_FOUNDATION, pile, card // 13
+
+    if target_kind == TO_FREECELL:
+        empty = [i for i, entry in enumerate(board.free_cells) if card_id(entry) is None]
+        if pile == FREECELL_PILE or not empty:
+            return None
+        return MOVE_TO_FREECELL, pile, empty[0]
+
+    if target_card == NO_CARD:
+        targets = [i for i, pile in enumerate(board.tableau) if not pile]
+    else:
+        targets = [i for i, pile in enumerate(board.tableau) if pile and card_id(pile[-1]) == target_card]
+    if not targets:
+        return None
+
+    if pile == FREECELL_PILE:
+        return MOVE_TO_TABLEAU, depth, targets[0]
+    count = len(board.tableau[pile]) - depth
+    if count == 1:
+        return MOVE_TABLEAU_TO_TABLEAU, pile, targets[0]
+    return MOVE_SUPERMOVE, pile, targets[0], count
+
+
+class SolutionStore:
+    def __init__(self, path):
+        self.path = path
+        # Batch workers share the file; WAL lets them read while one of them writes
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("BEGIN IMMEDIATE")  # workers opening the file together upgrade it only once
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != STORE_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS positions")
+            self.connection.execute(f"PRAGMA user_version = {STORE_VERSION}")
+        self.connection.execute(SCHEMA)
+        self.connection.execute("COMMIT")
+        self.connection.isolation_level = ""
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def row(self, board):
+        """(solvable, card, target kind, target card, remaining) stored for board, None if there is none"""
+        row = self.connection.execute("SELECT position, solvable, card, target_kind, target_card, remaining "
+                                      "FROM positions WHERE key = ?", (store_key(board),)).fetchone()
+        if row is None or row[0] != board.position_code():
+            return None  # nothing stored, or the row is about another position with the same key
+        return row[1:]
+
+    def is_unsolvable(self, board):
+        row = self.row(board)
+        return row is not None and not row[0]
+
+    def solution(self, board):
+        """Move log records from board to a win, following the stored rows; None when board is not stored.
+        A row that does not fit the board (a key collision) also gives None"""
+        row = self.row(board)
+        if row is None or not row[0]:
+            return None
+
+        board = board.clone()
+        while not board.is_winner():
+            if row is None or not row[0]:
+                return None
+            solvable, card, target_kind, target_card, remaining = row
+            move = board_move(board, (card, target_kind, target_card))
+            if move is None or not board.apply(move):
+                return None
+
+            row = self.row(board) if not board.is_winner() else None
+            if row is not None and row[4] >= remaining:
+                return None  # the remainders only ever shrink along a stored line
+        return list(board.move_log)
+
+    def add_solution(self, board, records):
+        """Store every position of a winning line: records are move log records played from board"""
+        board = board.clone()
+        rows = []
+        for i, record in enumerate(records):
+            card, target_kind, target_card = portable_move(board, record)
+            rows.append((store_key(board), board.position_code(), card, target_kind, target_card, len(records) - i))
+            board.apply(record_to_move(record))
+
+        with self.connection:
+            self.connection.executemany(UPSERT, rows)
+
+    def add_unsolvable(self, board):
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO positions (key, position, solvable) VALUES (?, ?, 0)",
+                                    (store_key(board), board.position_code()))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
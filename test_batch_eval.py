@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from batch_eval import BatchEvaluator
+from compact_state import CompactBoardState
+from freecell_bot import BoardState
+
+
+def random_position(deal, moves, seed):
+    board = BoardState.from_deal(deal)
+    rng = random.Random(seed)
+    for _ in range(moves):
+        legal = board.legal_moves()
+        if not legal:
+            break
+        board.apply(rng.choice(legal))
+    return board
+
+
+def test_score_states_matches_calculate_heuristic():
+    states = [random_position(deal, moves, deal) for deal in range(1, 15) for moves in (0, 20, 60)]
+
+    scores = BatchEvaluator().score_states(states)
+
+    assert scores == pytest.approx([state.calculate_heuristic(False) for state in states])
+
+
+def test_score_children_matches_and_restores_board():
+    board = random_position(3, 10, 3)
+    key = board.transposition_key()
+
+    moves, scores = BatchEvaluator().score_children(board)
+
+    expected = []
+    for move in moves:
+        played = board.apply_with_auto_play(move)
+        expected.append(board.calculate_heuristic(False))
+        board.undo_all(played)
+    assert moves and scores == pytest.approx(expected)
+    assert board.transposition_key() == key
+
+
+def test_compact_state_packs_like_board_state():
+    board = random_position(5, 25, 5)
+    compact = CompactBoardState.from_board_state(board)
+
+    scores = BatchEvaluator().score_states([board, compact])
+
+    assert scores[0] == pytest.approx(scores[1])
@@ -0,0 +1,39 @@
+from batch_solve import parse_seeds, read_deal_file, run_batch, solve_deal
+
+
+def test_parse_seeds_ranges_and_singles():
+    assert parse_seeds("0-3,7, 10-11") == [0, 1, 2, 3, 7, 10, 11]
+
+
+def test_read_deal_file_skips_comments(tmp_path):
+    deals = tmp_path / "deals.txt"
+    deals.write_text("# nightly set\n4\n\n9  # hard one\n")
+    assert read_deal_file(deals) == [4, 9]
+
+
+def test_solve_deal_record():
+    record = solve_deal(1, max_nodes=2000)
+
+    assert record["seed"] == 1 and record["solved"]
+    assert record["move_count"] == len(record["moves"]) > 0
+    assert 0 < record["nodes"] <= 2000
+    assert record["peak_rss_mb"] > 0
+
+
+def test_solve_deal_stats():
+    record = solve_deal(3, max_nodes=500, ms=True, stats=True)
+    stats = record["stats"]
+
+    assert stats["expanded"] == record["nodes"]
+    assert stats["generated"] >= stats["duplicates"]["queue"] > 0
+    assert stats["heuristic_calls"] > 0 and stats["clones"] > 0
+    assert set(stats["timers"]) == {"move_generation", "hashing", "heuristic"}
+    assert "stats" not in solve_deal(3, max_nodes=50, ms=True)
+
+
+def test_failing_deal_yields_an_error_record():
+    records = {record["seed"]: record for record in run_batch([3, -1], workers=1, max_nodes=50, ms=True)}
+
+    assert set(records) == {3, -1}
+    assert "error" not in records[3] and records[3]["nodes"] > 0
+    assert not records[-1]["solved"] and "ValueError" in records[-1]["error"]
@@ -0,0 +1,10 @@
+from benchmark import compare
+
+
+def test_compare_flags_only_regressions_beyond_threshold():
+    baseline = {"solver": {"nodes_per_second": 1000, "total_time": 10.0}, "micro": {"clone_us": 5.0}}
+    results = {"solver": {"nodes_per_second": 850, "total_time": 10.5}, "micro": {"clone_us": 4.0}}
+
+    regressions = compare(results, baseline, threshold=0.10)
+
+    assert [regression["metric"] for regression in regressions] == ["solver.nodes_per_second"]
@@ -0,0 +1,310 @@
+import random
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import freecell_bot
+from freecell_game import FreeCell
+from constants import TYPES, VICTORY_SCORE
+from freecell_bot import (BoardState, BotMove, Card, FreecellBot, MaxPriorityQueue, TranspositionTable, CAN_STACK,
+                          MOVE_FREECELL_TO_FOUNDATION, MOVE_SUPERMOVE, MOVE_TO_FOUNDATION, best_at_common_depth,
+                          record_to_move, root_children, search_subtree, shutdown_hint_pool)
+
+
+def test_canonical_key_ignores_column_and_cell_order():
+    random.seed(6)
+    board = FreeCell().get_board()
+    board.move_to_freecell(0)
+    board.move_to_freecell(3)
+
+    mirrored = board.clone()
+    mirrored.tableau.reverse()
+    mirrored.free_cells.reverse()
+    mirrored.rehash()
+
+    assert mirrored.key != board.key
+    assert mirrored.canonical_key() == board.canonical_key()
+    assert mirrored.canonical_key(suit_swap=True) == board.canonical_key(suit_swap=True)
+
+
+def test_canonical_key_separates_distinct_positions():
+    tableau = [[] for _ in range(8)]
+    tableau[0] = [Card('7', 'Clubs')]
+    tableau[1] = [Card('7', 'Spades')]
+    tableau[2] = [Card('K', 'Diamonds'), Card('6', 'Hearts')]
+    board = BoardState(tableau, [None] * 4, {suit: [] for suit in TYPES}, initialize_deck=False)
+
+    on_clubs, on_spades = board.clone(), board.clone()
+    on_clubs.move_tableau_to_tableau(2, 0)
+    on_spades.move_tableau_to_tableau(2, 1)
+    assert on_clubs.canonical_key() != on_spades.canonical_key()
+    assert on_clubs.canonical_key() == on_clubs.compute_key(symmetric=True)
+
+    # Same cards at the same depths, but two of them swap columns
+    deal = BoardState.from_deal(1)
+    swapped = deal.clone()
+    swapped.tableau[0][3], swapped.tableau[1][3] = swapped.tableau[1][3], swapped.tableau[0][3]
+    swapped.rehash()
+    assert swapped.canonical_key() != deal.canonical_key()
+    assert swapped.canonical_key(suit_swap=True) != deal.canonical_key(suit_swap=True)
+
+
+def rebuilt_locations(board):
+    """The location index as rehash() builds it from the piles"""
+    fresh = board.clone()
+    fresh.rehash()
+    return fresh.locations
+
+
+def test_apply_undo_restores_board():
+    random.seed(7)
+    board = FreeCell().get_board()
+    board.move_to_freecell(2)
+
+    for move in board.legal_moves():
+        before = board.clone()
+        log = list(board.move_log)
+        board.apply(move)
+        assert board.key == board.compute_key()
+        assert board.canonical_key() == board.compute_key(symmetric=True)
+        assert board.locations == rebuilt_locations(board)
+        assert board.move_log[:-1] == log
+        board.undo(move)
+        assert board == before and board.canonical_key() == before.canonical_key()
+        assert board.locations == before.locations == rebuilt_locations(board)
+        assert board.move_log == log
+
+
+def test_location_index_follows_foundation_moves():
+    tableau = [[] for _ in range(8)]
+    tableau[0] = [Card('5', 'Hearts'), Card('A', 'Spades')]
+    tableau[1] = [Card('A', 'Clubs'), Card('9', 'Diamonds')]  # buried: no foundation move
+    board = BoardState(tableau, [Card('A', 'Hearts'), None, None, None], {suit: [] for suit in TYPES},
+                       initialize_deck=False)
+    before = board.clone()
+
+    moves = board.foundation_moves()
+    assert sorted(moves) == sorted([(MOVE_TO_FOUNDATION, 0, TYPES.index('Spades')),
+                                    (MOVE_FREECELL_TO_FOUNDATION, 0, TYPES.index('Hearts'))])
+
+    played = board.auto_play()
+    assert len(played) == 2 and board.foundation_moves() == []
+    assert board.locations == rebuilt_locations(board)
+    assert board.locations[Card('A', 'Spades').id] is None and board.locations[Card('A', 'Hearts').id] is None
+    assert board.locations[Card('5', 'Hearts').id] == (0, 0)
+
+    board.undo_all(played)
+    assert board == before and board.locations == before.locations == rebuilt_locations(board)
+
+
+def test_cached_heuristic_matches_fresh_board():
+    random.seed(8)
+    board = FreeCell().get_board()
+
+    for _ in range(40):
+        moves = board.legal_moves()
+        if not moves:
+            break
+        board.apply(random.choice(moves))
+        board.calculate_heuristic(False)
+
+    fresh = BoardState([list(pile) for pile in board.tableau], list(board.free_cells),
+                       {suit: list(pile) for suit, pile in board.foundations.items()}, initialize_deck=False)
+    fresh.move_count = board.move_count
+    assert board.calculate_heuristic(False) == fresh.calculate_heuristic(False)
+
+
+def test_supermove_moves_sequence_once():
+    tableau = [[] for _ in range(8)]
+    tableau[0] = [Card('K', 'Hearts'), Card('Q', 'Spades'), Card('J', 'Hearts'), Card('10', 'Clubs')]
+    tableau[1] = [Card('K', 'Diamonds')]
+    board = BoardState(tableau, [None] * 4, {suit: [] for suit in TYPES}, initialize_deck=False)
+
+    move = (MOVE_SUPERMOVE, 0, 1, 3)
+    assert move in board.legal_moves()
+
+    before = board.clone()
+    board.apply(move)
+    assert board.tableau[0] == [Card('K', 'Hearts')]
+    assert board.tableau[1] == [Card('K', 'Diamonds'), Card('Q', 'Spades'), Card('J', 'Hearts'), Card('10', 'Clubs')]
+    assert board.key == board.compute_key()
+    assert board.locations == rebuilt_locations(board)
+
+    board.undo(move)
+    assert board == before and board.locations == rebuilt_locations(board)
+
+
+def test_auto_play_only_plays_safe_foundation_moves():
+    tableau = [[] for _ in range(8)]
+    tableau[0] = [Card('3', 'Hearts'), Card('2', 'Spades')]
+    tableau[1] = [Card('A', 'Spades')]
+    board = BoardState(tableau, [None] * 4, {suit: [] for suit in TYPES}, initialize_deck=False)
+
+    before = board.clone()
+    played = board.auto_play()
+    assert len(played) == 2
+    assert board.tableau[0] == [Card('3', 'Hearts')]
+    assert board.locations == rebuilt_locations(board)
+
+    board.undo_all(played)
+    assert board == before and board.key == before.key
+
+
+def test_hints_do_not_share_search_state():
+    random.seed(9)
+    game = FreeCell()
+    bot = FreecellBot()
+
+    first = bot.get_hint(game)
+    first_context = bot.context
+    second = bot.get_hint(game)
+
+    assert bot.context is not first_context
+    assert first.get_board() == second.get_board() and first.get_score() == second.get_score()
+
+
+def test_lookup_tables_follow_the_card_rules():
+    cards = [Card(rank, suit) for suit in TYPES for rank in ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10',
+                                                             'J', 'Q', 'K']]
+    for card in cards:
+        for target in cards:
+            expected = card.value == target.value - 1 and card.color != target.color
+            assert CAN_STACK[card.id][target.id] == expected
+
+    board = BoardState.from_deal(1)
+    assert [board.is_valid_foundation_move(card) for card in cards] == [card.rank == 'A' for card in cards]
+
+
+def test_solve_returns_best_partial_line_within_budget():
+    bot = FreecellBot()
+    partial = bot.solve(FreeCell(deal=617), max_nodes=150)
+
+    assert partial.reason == "node_budget" and not partial.solved and partial.nodes == 150
+    assert partial.moves and partial.foundation_cards > 0
+    assert partial.board.cards_left() == 52 - partial.foundation_cards
+
+    solved = FreecellBot().solve(FreeCell(deal=3), time_limit=30)
+    assert solved.reason == "solved" and solved.board.is_winner()
+
+
+def test_ms_deal_numbers():
+    board = BoardState.from_deal(1)
+    assert board.tableau[0][:2] == [Card('J', 'Diamonds'), Card('K', 'Diamonds')]
+    assert [len(pile) for pile in board.tableau] == [7, 7, 7, 7, 6, 6, 6, 6]
+
+    assert FreeCell(deal=617).get_board() == BoardState.from_deal(617)
+
+
+def test_lazy_nodes_are_scored_on_pop_and_requeued_when_they_fall_behind():
+    bot = FreecellBot(lazy=True)
+    bot.start_search(FreeCell(deal=3))
+    children = sorted(root_children(bot.start_board).values(), key=lambda child: child[2])
+    worst, best = children[0], children[-1]
+    assert worst[2] < best[2]
+
+    # A lazy node whose provisional score overrates it, and an eagerly scored better node
+    lazy = BotMove(worst[0], None, bot.context, worst[1], score=VICTORY_SCORE - 1)
+    bot.push(lazy)
+    bot.push(BotMove(best[0], None, bot.context, best[1]))
+    assert not lazy.evaluated and bot.context.evaluations == 1
+
+    # Scored when it reaches the front, found worse than the next node, so pushed back behind it
+    assert bot.pop_best().get_board() is best[0]
+    assert lazy.evaluated and lazy.get_score() == worst[2]
+    assert bot.context.evaluations == 2 and bot.context.requeued == 1
+
+    # Already scored: popped as it is, without another evaluation
+    assert bot.pop_best() is lazy and bot.context.evaluations == 2
+
+    # A lazy node that is still the best after scoring is returned straight away
+    bot.push(BotMove(worst[0], None, bot.context, worst[1]))
+    bot.push(BotMove(best[0], None, bot.context, best[1], score=VICTORY_SCORE - 1))
+    assert bot.pop_best().get_board() is best[0]
+    assert bot.context.evaluations == 4 and bot.context.requeued == 1
+
+
+def test_bounded_queue_evicts_worst_nodes():
+    class Scored:
+        def __init__(self, score):
+            self.score = score
+
+        def get_score(self):
+            return self.score
+
+        def __lt__(self, other):
+            return self.score < other.score
+
+    queue = MaxPriorityQueue(max_size=10)
+    evicted = []
+    for score in range(100):
+        evicted += queue.push(Scored(score))
+
+    assert queue.size() <= queue.trim_size and queue.evicted == len(evicted) > 0
+    assert max(node.score for node in evicted) < min(node.score for _, node in queue.heap)
+    assert queue.pop().score == 99
+
+
+def test_solution_rebuilt_from_bot_moves_replays_to_a_win():
+    game = FreeCell(deal=2)
+    bot = FreecellBot()
+    for state in bot.get_plays(game):
+        if state.is_winner():
+            break
+
+    board = BoardState.from_deal(2)
+    for kind, source, target, count, card in bot.solution_moves():
+        board.apply((kind, source, target, count) if kind == MOVE_SUPERMOVE else (kind, source, target))
+    assert board.is_winner()
+    assert bot.solution_text().count("\n") == len(bot.solution_moves()) - 1
+
+
+def test_transposition_table_depth_and_lru():
+    table = TranspositionTable(max_size=2)
+    table.put(1, 3, 10.0)
+    table.put(2, 1, 20.0)
+
+    assert table.get(1, 2) == 10.0  # deeper result answers a shallower request
+    assert table.get(2, 2) is None
+
+    table.put(3, 1, 30.0)  # evicts key 2, the least recently used
+    assert table.get(2, 1) is None and table.get(1, 3) == 10.0
+    assert table.evictions == 1 and table.hit_rate() == 0.5
+
+
+def test_parallel_hint_returns_a_root_move():
+    game = FreeCell(deal=3)
+    bot = FreecellBot()
+    try:
+        hint = bot.get_parallel_hint(game, max_depth=1, time_budget=5.0)
+    finally:
+        shutdown_hint_pool()
+
+    board = BoardState.from_deal(3)
+    for record in hint.moves:
+        assert board.apply(record_to_move(record)) is not False
+    assert board == hint.get_board()
+    assert bot.hint_stats["root_moves"] >= bot.hint_stats["searched"] > 0
+
+
+def test_search_subtree_reports_every_completed_depth():
+    board = BoardState.from_deal(3)
+    assert search_subtree(board, 3, 0.0) == [board.calculate_heuristic(False)]
+    assert len(search_subtree(board, 2, 5.0)) == 3
+
+    # Moves are compared at the depth all of them reached, not at the deepest score of one of them
+    key, score, depth = best_at_common_depth({"a": [5.0, 1.0, 9.0], "b": [4.0, 2.0]})
+    assert (key, score, depth) == ("b", 2.0, 1)
+
+
+def test_parallel_hint_survives_a_broken_pool(monkeypatch):
+    class BrokenPool:
+        def submit(self, *args):
+            future = Future()
+            future.set_exception(BrokenProcessPool("worker died"))
+            return future
+
+    shutdowns = []
+    monkeypatch.setattr(freecell_bot, "get_hint_pool", BrokenPool)
+    monkeypatch.setattr(freecell_bot, "shutdown_hint_pool", lambda: shutdowns.append(True))
+    hint = FreecellBot().get_parallel_hint(FreeCell(deal=3), max_depth=1, time_budget=1.0)
+
+    assert hint is not None and shutdowns == [True]
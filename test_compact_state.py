@@ -0,0 +1,43 @@
+import random
+
+from freecell_game import FreeCell
+from compact_state import CompactBoardState
+
+
+def test_compact_round_trip():
+    random.seed(3)
+    board = FreeCell().get_board()
+    compact = CompactBoardState.from_board_state(board)
+
+    assert compact.to_board_state().tableau == board.tableau
+    assert compact.calculate_heuristic(False) == board.calculate_heuristic(False)
+
+
+def test_compact_moves_match_board_state():
+    random.seed(4)
+    board = FreeCell().get_board()
+    compact = CompactBoardState.from_board_state(board)
+
+    for i in range(8):
+        assert board.move_to_freecell(i) == compact.move_to_freecell(i)
+        assert board.move_to_foundation(i) == compact.move_to_foundation(i)
+
+    assert compact.to_board_state().tableau == board.tableau
+    assert compact.to_board_state().free_cells == board.free_cells
+    assert compact.move_log == board.move_log
+
+
+def test_zobrist_key_tracks_moves():
+    random.seed(5)
+    board = FreeCell().get_board()
+    compact = CompactBoardState.from_board_state(board)
+
+    for i in range(8):
+        board.move_to_freecell(i)
+        compact.move_to_freecell(i)
+        board.move_tableau_to_tableau(i, (i + 1) % 8)
+        compact.move_tableau_to_tableau(i, (i + 1) % 8)
+
+    assert board.key == board.compute_key() == compact.key
+    assert board.canonical_key() == board.compute_key(symmetric=True) == compact.canonical_key() == compact.compute_key(True)
+    assert board == board.clone() and hash(board) == hash(board.clone())
@@ -0,0 +1,68 @@
+import time
+
+from freecell_bot import BoardState, record_to_move, shutdown_hint_pool
+from hint_engine import HintEngine
+
+
+def ponder_until_idle(engine, board, timeout=30):
+    deadline = time.time() + timeout
+    engine.update(board)
+    while (engine.job is not None or engine.next_job is not None) and time.time() < deadline:
+        time.sleep(0.01)
+        engine.update(board)
+
+
+def test_pondered_hints_cover_the_expected_line():
+    board = BoardState.from_deal(3)
+    engine = HintEngine(max_depth=2, follow_plies=1, task_budget=5.0)
+    assert engine.hint(board) is None
+
+    try:
+        ponder_until_idle(engine, board)
+    finally:
+        shutdown_hint_pool()
+
+    hint = engine.hint(board)
+    assert hint is not None and hint.moves
+    assert engine.cached_depth(board.transposition_key()) == 2
+
+    # Playing the hinted move reaches a position that was pondered ahead of the player
+    for record in hint.moves:
+        board.apply(record_to_move(record))
+    assert engine.hint(board) is not None
+
+
+def test_hint_keeps_the_players_column_order():
+    board = BoardState.from_deal(8)
+    engine = HintEngine(max_depth=1, follow_plies=0, task_budget=5.0)
+    try:
+        ponder_until_idle(engine, board)
+    finally:
+        shutdown_hint_pool()
+
+    # The same position with the columns the other way round: a cache hit, played on this board
+    mirrored = board.clone()
+    mirrored.tableau.reverse()
+    mirrored.rehash()
+    hint = engine.hint(mirrored)
+    assert hint is not None
+
+    replayed = mirrored.clone()
+    for record in hint.moves:
+        assert replayed.apply(record_to_move(record))
+    assert replayed == hint.get_board()
+    assert hint.get_board().canonical_key() == engine.hint(board).get_board().canonical_key()
+
+
+def test_moves_out_of_budget_are_not_cached_as_searched():
+    board = BoardState.from_deal(3)
+    engine = HintEngine(max_depth=3, follow_plies=1, task_budget=0.0)
+    try:
+        ponder_until_idle(engine, board)
+    finally:
+        shutdown_hint_pool()
+
+    # No root move got past its one-ply score: nothing to hint, and the position is not searched again
+    key = board.transposition_key()
+    assert engine.hint(board) is None
+    assert engine.depth_limits[key] == 0 and engine.next_job is None
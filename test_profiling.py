@@ -0,0 +1,37 @@
+import json
+
+from batch_solve import solve_deal
+from freecell_bot import BoardState
+from profiling import ComponentTimers, compare_components
+
+
+def test_component_timers_time_scorers_and_restore_methods():
+    original = BoardState.get_foundation_score
+    board = BoardState.from_deal(1)
+
+    with ComponentTimers() as timers:
+        board.calculate_heuristic(False)
+        board.legal_moves()
+    summary = timers.summary()
+
+    assert BoardState.get_foundation_score is original
+    assert summary["heuristic"]["calls"] == summary["foundation"]["calls"] == 1
+    assert summary["move_generation"]["calls"] == 1
+    assert list(summary) == sorted(summary)
+
+
+def test_profile_dir_writes_prof_and_json(tmp_path):
+    record = solve_deal(3, max_nodes=300, ms=True, profile_dir=str(tmp_path))
+
+    assert (tmp_path / "ms-3.prof").exists()
+    with open(record["profile"]) as profile_file:
+        profile = json.load(profile_file)
+    assert profile["seed"] == 3 and profile["components"]["heuristic"]["calls"] > 0
+    assert profile["functions"]
+
+
+def test_compare_components_biggest_change_first():
+    old = {"chains": {"seconds": 1.0}, "balance": {"seconds": 0.5}}
+    new = {"chains": {"seconds": 1.1}, "balance": {"seconds": 0.1}, "clone": {"seconds": 0.2}}
+
+    assert [row[0] for row in compare_components(old, new)] == ["balance", "clone", "chains"]
@@ -0,0 +1,44 @@
+import pytest
+
+from freecell_game import FreeCell
+from freecell_bot import BoardState, FreecellBot, record_to_move
+from search_engines import IDAStarEngine, SearchEngine, WeightedAStarEngine, make_engine
+
+
+def solve(engine, deal, max_nodes=5000):
+    bot = FreecellBot(engine=engine)
+    for nodes, state in enumerate(bot.get_plays(FreeCell(deal=deal)), 1):
+        if nodes >= max_nodes:
+            break
+    return bot
+
+
+def replays_to_win(deal, records):
+    board = BoardState.from_deal(deal)
+    for record in records:
+        assert board.apply(record_to_move(record)) is not False
+    return board.is_winner()
+
+
+@pytest.mark.parametrize("engine", [WeightedAStarEngine(1.0), WeightedAStarEngine(2.0), IDAStarEngine(2.0)])
+def test_engines_find_valid_solutions(engine):
+    bot = solve(engine, 3)
+
+    assert engine.solution and replays_to_win(3, bot.solution_moves())
+    assert bot.plays[0] == bot.start_board and bot.plays[-1].is_winner()
+
+
+def test_lower_weight_never_gives_longer_solution():
+    optimal_ish = solve(WeightedAStarEngine(1.0), 3).solution_moves()
+    greedy_ish = solve(WeightedAStarEngine(5.0), 3).solution_moves()
+
+    assert len(optimal_ish) <= len(greedy_ish)
+
+
+def test_make_engine():
+    assert make_engine("greedy") is None
+    assert isinstance(make_engine("idastar", 1.5, "admissible"), IDAStarEngine)
+    with pytest.raises(ValueError):
+        make_engine("bfs")
+    with pytest.raises(TypeError):
+        SearchEngine()  # abstract: an engine has to implement search and current_moves
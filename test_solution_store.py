@@ -0,0 +1,95 @@
+import sqlite3
+
+from constants import FREECELL_COUNT, TYPES
+from deals import deal_columns
+from freecell_bot import BoardState, Card, FreecellBot, record_to_move
+from freecell_game import FreeCell
+from solution_store import SolutionStore, store_key
+
+
+def solve(deal, store, max_nodes=3000):
+    bot = FreecellBot(store=store)
+    return bot, bot.solve(FreeCell(deal=deal), max_nodes=max_nodes)
+
+
+def test_solved_deal_comes_back_from_the_store(tmp_path):
+    with SolutionStore(str(tmp_path / "solutions.db")) as store:
+        _, first = solve(3, store)
+        bot, again = solve(3, store)
+
+        assert first.solved and again.solved and again.nodes == 1
+        assert bot.stored_line is not None and again.board.is_winner()
+        assert [record[:4] for record in again.moves] == [record[:4] for record in first.moves]
+        assert bot.get_hint(FreeCell(deal=3)).moves == (first.moves[0],)
+
+
+def test_stored_line_replays_on_reordered_columns(tmp_path):
+    with SolutionStore(str(tmp_path / "solutions.db")) as store:
+        _, first = solve(8, store)
+
+        # Same position with the columns in reverse order: same canonical key, other column indices
+        columns = [[Card(rank, suit) for rank, suit in column] for column in reversed(deal_columns(8))]
+        board = BoardState(columns, [None] * FREECELL_COUNT, {suit: [] for suit in TYPES}, initialize_deck=False)
+        line = store.solution(board)
+
+        assert line is not None and len(line) == len(first.moves)
+        for record in line:
+            board.apply(record_to_move(record))
+        assert board.is_winner()
+
+
+def test_search_splices_in_a_stored_remainder(tmp_path):
+    _, plain = solve(2, None)
+
+    with SolutionStore(str(tmp_path / "solutions.db")) as store:
+        # Store only the second half of the line, as if another deal had passed through it
+        board = BoardState.from_deal(2)
+        half = len(plain.moves) // 2
+        for record in plain.moves[:half]:
+            board.apply(record_to_move(record))
+        store.add_solution(board, plain.moves[half:])
+
+        bot, spliced = solve(2, store)
+
+        assert spliced.solved and bot.stored_line is not None
+        assert spliced.nodes < plain.nodes and spliced.board.is_winner()
+        assert len(store) == len(plain.moves)  # the first half was added too
+
+
+def test_unsolvable_mark(tmp_path):
+    with SolutionStore(str(tmp_path / "solutions.db")) as store:
+        board = BoardState.from_deal(5)
+        store.add_unsolvable(board)
+
+        assert store.is_unsolvable(board) and store.solution(board) is None
+        assert solve(5, store)[1].nodes == 0
+
+
+def test_rows_of_another_position_with_the_same_key_are_ignored(tmp_path):
+    path = str(tmp_path / "solutions.db")
+    with SolutionStore(path) as store:
+        board, other = BoardState.from_deal(5), BoardState.from_deal(6)
+        # A mark for deal 6 filed under the key of deal 5, as a key collision would
+        store.connection.execute("INSERT INTO positions (key, position, solvable) VALUES (?, ?, 0)",
+                                 (store_key(board), other.position_code()))
+        store.connection.commit()
+
+        assert not store.is_unsolvable(board) and store.solution(board) is None
+        assert solve(5, store, max_nodes=50)[1].nodes > 0
+
+    # Stores written before rows carried their position are dropped when opened
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA user_version = 1")
+    connection.close()
+    with SolutionStore(path) as store:
+        assert len(store) == 0
+
+
+def test_no_unsolvable_mark_after_merging_distinct_positions(tmp_path, monkeypatch):
+    # A key that only has 64 values: the search soon runs dry, having skipped positions it never saw
+    monkeypatch.setattr(BoardState, "transposition_key", lambda board: board.canonical_key() % 64)
+    with SolutionStore(str(tmp_path / "solutions.db")) as store:
+        bot, result = solve(5, store)
+
+        assert result.reason == "exhausted" and bot.context.key_collisions > 0
+        assert not store.is_unsolvable(BoardState.from_deal(5))